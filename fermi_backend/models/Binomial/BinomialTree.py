@@ -7,11 +7,23 @@ Created on Wed Aug  1 09:37:13 2018
 
 import math
 import numpy as np
-from scipy.special import comb
+from .lattice import lattice_price, terminal_prices, terminal_probabilities, backward_induction
 
 
 # np.set_printoptions(suppress=True)
 
+def applyNodeFunc(func, values):
+    # Apply a node function to a whole level at once. Functions are expected to be NumPy ufunc-style
+    # (array in, array out); constants are broadcast, and scalar-only callables fall back to one call per node
+    try:
+        result = np.asarray(func(values), dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array(list(map(func, values)), dtype=np.float64)
+    if result.shape != values.shape:
+        result = np.broadcast_to(result, values.shape).copy()
+    return result
+
+
 class BinomialTree:
 
     def __init__(self, rf=0.05, steps=50, vol=0.2, ttm=2):
@@ -33,41 +45,43 @@ class BinomialTree:
 
     def optionExercise(self, k, is_call=True):
         if is_call:
-            return lambda x: x - k if (x - k > 0) else 0
+            return lambda x: np.maximum(x - k, 0)
         else:
-            return lambda x: k - x if (k - x > 0) else 0
+            return lambda x: np.maximum(k - x, 0)
 
     def Tree(self, s0=100, func=None):
+        # Terminal level in closed form; self.options keeps steps + 1 slots and the first currStep + 1 are live
         self.s0 = s0
-        self.options = np.zeros(self.steps + 1)
-        for i in range(self.steps + 1):
-            self.options[i] = s0 * math.pow(self.up, i) * math.pow(self.dn, self.currStep - i)
+        self.currStep = self.steps
+        self.options = terminal_prices(s0, self.up, self.dn, self.steps)
+        self.scratch = np.empty(self.steps, dtype=np.float64)
         if func is not None:
-            self.options = np.array((list(map(func, self.options))))
+            self.options = applyNodeFunc(func, self.options)
 
     def reverse(self, Prob=False, func=None):
-        last_step_opt = self.options.copy()
+        # One backward step in place on the live slice
+        backward_induction(self.options[:self.currStep + 1], self.pr, 1 / self.rh, self.scratch,
+                           stop=self.currStep - 1)
         self.currStep = self.currStep - 1
-        for i in range(self.currStep + 1):
-            self.options[i] = (last_step_opt[i + 1] * self.pr + last_step_opt[i] * (1 - self.pr)) / self.rh
         if func is not None:
-            self.options = np.array((list(map(func, self.options))))
+            self.options[:self.currStep + 1] = applyNodeFunc(func, self.options[:self.currStep + 1])
 
     def reverseToBeginning(self):
-        while self.currStep > 0:
-            self.reverse()
+        if self.currStep > 0:
+            backward_induction(self.options[:self.currStep + 1], self.pr, 1 / self.rh, self.scratch)
+            self.currStep = 0
         return self.options[0]
 
     def calculateProb(self):
-        self.probs = np.zeros(self.currStep + 1)
-        for i in range(self.currStep + 1):
-            self.probs[i] = comb(self.currStep, i) * math.pow(self.pr, i) * math.pow(1 - self.pr, self.currStep - i)
-        self.probs.reshape(1, -1)
+        # Binomial weights in log space, no comb() overflow for large step counts
+        self.probs = terminal_probabilities(self.pr, self.currStep)
 
     def expectedResult(self, func=None):
         self.calculateProb()
-        nodes = np.array((list(map(func, self.options.copy())))).reshape(-1, 1)
-        return np.dot(self.probs, nodes)[0]
+        nodes = self.options[:self.currStep + 1]
+        if func is not None:
+            nodes = applyNodeFunc(func, nodes)
+        return np.dot(self.probs, nodes)
 
 
 def binomial_tree(S, K, T, r, sigma, N, Option_type):
@@ -79,39 +93,12 @@ def binomial_tree(S, K, T, r, sigma, N, Option_type):
     :param r: risk-free rate
     :param sigma: volatility
     :param N: number of steps for binomial tree
-    :param Option_type: 'call' or 'put'. Default 'call'
+    :param Option_type: 'C'/'call' or 'P'/'put'
     :return: option price
     """
 
-    # upward factor
-    u = np.exp(sigma * np.sqrt(T / N))
-    # downward factor
-    d = np.exp(-sigma * np.sqrt(T / N))
-    # prob for price rise
-    pu = ((np.exp(r * T / N)) - d) / (u - d)
-    # prob for price down
-    pd = 1 - pu
-    # discount rate
-    disc = np.exp(-r * T / N)
-
-    St = [0] * (N + 1)
-    C = [0] * (N + 1)
-
-    St[0] = S * d ** N
-
-    for j in range(1, N + 1):
-        St[j] = St[j - 1] * u / d
-
-    for j in range(1, N + 1):
-        if Option_type == 'P':
-            C[j] = max(K - St[j], 0)
-        elif Option_type == 'C':
-            C[j] = max(St[j] - K, 0)
-    for i in range(N, 0, -1):
-        for j in range(0, i):
-            C[j] = disc * (pu * C[j + 1] + pd * C[j])
-
-    return C[0]
+    pcFlag = -1 if str(Option_type).upper().startswith('P') else 1
+    return lattice_price(S, K, T, r, sigma, N, pcFlag)
 
 
 if __name__ == '__main__':
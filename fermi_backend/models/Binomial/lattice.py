@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+Shared recombining-lattice engine.
+
+Backward induction is done with NumPy slice operations on one preallocated
+float64 value buffer (plus one scratch buffer of the same size), both reused
+in place at every step, so rolling a tree back costs O(N^2) flops but only
+O(N) memory and no per-node Python calls. European payoffs never need the
+intermediate levels, so they are priced in O(N) as the discounted expectation
+over the terminal nodes, which is the same number the recursion produces.
+
+Every function broadcasts over leading axes: node values live on the last
+axis, so a whole option chain is one (contracts, N + 1) array.
+"""
+
+import numpy as np
+from scipy.stats import binom
+
+# Upper bound on contracts * (N + 1) nodes held in memory at once by lattice_price
+MAX_LATTICE_NODES = 2 ** 22
+LATTICE_SCHEMES = ('crr', 'lr', 'trinomial')
+
+
+def crr_factors(vol, T, rf, N, div=0.0):
+    """
+    Cox-Ross-Rubinstein up/down factors, risk-neutral up probability and one-step discount factor
+
+    :param vol: volatility of the underlying asset
+    :param T: time to maturity (in years)
+    :param rf: risk-free rate
+    :param N: number of steps
+    :param div: continuous dividend yield
+    :return: (u, d, pu, disc)
+    """
+    dt = np.asarray(T, dtype=np.float64) / N
+    u = np.exp(vol * np.sqrt(dt))
+    d = np.exp(-vol * np.sqrt(dt))
+    pu = (np.exp((rf - div) * dt) - d) / (u - d)
+    disc = np.exp(-rf * dt)
+    return u, d, pu, disc
+
+
+def leisen_reimer_factors(s, k, vol, T, rf, N, div=0.0):
+    """
+    Leisen-Reimer up/down factors, up probability and one-step discount factor. The probabilities come from a
+    Peizer-Pratt inversion of the Black-Scholes d1/d2, which centres the tree on the strike and removes the
+    odd/even oscillation of CRR, giving second-order convergence in N. N should be odd
+
+    :param s: spot price
+    :param k: strike price
+    :param vol: volatility of the underlying asset
+    :param T: time to maturity (in years)
+    :param rf: risk-free rate
+    :param N: number of steps
+    :param div: continuous dividend yield
+    :return: (u, d, pu, disc)
+    """
+    T = np.asarray(T, dtype=np.float64)
+    dt = T / N
+    d1 = (np.log(s / k) + (rf - div + vol * vol / 2) * T) / (vol * np.sqrt(T))
+    d2 = d1 - vol * np.sqrt(T)
+
+    def peizer_pratt(z):
+        return 0.5 + np.sign(z) * np.sqrt(0.25 - 0.25 * np.exp(-(z / (N + 1 / 3 + 0.1 / (N + 1))) ** 2 * (N + 1 / 6)))
+
+    pu = peizer_pratt(d2)
+    growth = np.exp((rf - div) * dt)
+    u = growth * peizer_pratt(d1) / pu
+    d = (growth - pu * u) / (1 - pu)
+    disc = np.exp(-rf * dt)
+    return u, d, pu, disc
+
+
+def trinomial_factors(vol, T, rf, N, div=0.0):
+    """
+    Kamrad-Ritchken style trinomial factors: node prices move by u = exp(vol * sqrt(2 dt)), 1 or 1/u per step
+
+    :param vol: volatility of the underlying asset
+    :param T: time to maturity (in years)
+    :param rf: risk-free rate
+    :param N: number of steps
+    :param div: continuous dividend yield
+    :return: (u, pu, pm, pd, disc)
+    """
+    dt = np.asarray(T, dtype=np.float64) / N
+    half_up = np.exp(vol * np.sqrt(dt / 2))
+    half_growth = np.exp((rf - div) * dt / 2)
+    pu = ((half_growth - 1 / half_up) / (half_up - 1 / half_up)) ** 2
+    pd = ((half_up - half_growth) / (half_up - 1 / half_up)) ** 2
+    pm = 1 - pu - pd
+    return half_up ** 2, pu, pm, pd, np.exp(-rf * dt)
+
+
+def terminal_prices(s, u, d, N):
+    """
+    Underlying prices at the last level of the tree, ordered from the lowest node (j=0, all down moves)
+    to the highest node (j=N, all up moves)
+
+    :param s: spot price
+    :param u: upward factor
+    :param d: downward factor
+    :param N: number of steps
+    :return: array of shape (..., N + 1)
+    """
+    log_u = np.log(np.asarray(u, dtype=np.float64))[..., None]
+    log_d = np.log(np.asarray(d, dtype=np.float64))[..., None]
+    # s * d^N * (u/d)^j, evaluated in log space so large N doesn't overflow
+    prices = np.arange(N + 1) * (log_u - log_d) + (N * log_d + np.log(np.asarray(s, dtype=np.float64))[..., None])
+    np.exp(prices, out=prices)
+    return prices
+
+
+def terminal_probabilities(pu, N):
+    """
+    Risk-neutral probabilities of reaching each terminal node, ordered like terminal_prices
+
+    :param pu: risk-neutral probability of an up move
+    :param N: number of steps
+    :return: array of shape (..., N + 1)
+    """
+    # binom.pmf works in log space, so comb(N, j) never overflows for large N
+    return binom.pmf(np.arange(N + 1), N, np.asarray(pu, dtype=np.float64)[..., None])
+
+
+def backward_induction(values, pu, disc, scratch=None, exercise=None, stop=0):
+    """
+    Roll node values back towards the root in place
+
+    :param values: float64 array of shape (..., n + 1) holding the node values of level n, overwritten during the
+                   recursion; on return values[..., :stop + 1] holds level `stop`
+    :param pu: risk-neutral probability of an up move, scalar or broadcastable to values.shape[:-1]
+    :param disc: one-step discount factor, scalar or broadcastable to values.shape[:-1]
+    :param scratch: optional float64 buffer of shape (..., n), reused across steps
+    :param exercise: optional callable exercise(level, out) writing the exercise value of every node of `level`
+                     into out[..., :level + 1]; node values become np.maximum(continuation, exercise)
+    :param stop: level to stop at, 0 rolls back to the root
+    :return: value at the first node of level `stop`, shape values.shape[:-1]
+    """
+    n = values.shape[-1] - 1
+    if scratch is None:
+        scratch = np.empty(values.shape[:-1] + (max(n, 1),), dtype=np.float64)
+    up_weight = np.asarray(disc * pu, dtype=np.float64)[..., None]
+    down_weight = np.asarray(disc * (1 - pu), dtype=np.float64)[..., None]
+    for i in range(n, stop, -1):
+        # values[j] <- disc * (pu * values[j + 1] + (1 - pu) * values[j]) for j < i
+        np.multiply(values[..., 1:i + 1], up_weight, out=scratch[..., :i])
+        values[..., :i] *= down_weight
+        values[..., :i] += scratch[..., :i]
+        if exercise is not None:
+            exercise(i - 1, scratch)
+            np.maximum(values[..., :i], scratch[..., :i], out=values[..., :i])
+    return values[..., 0]
+
+
+def rollback_european(values, pu, disc, level):
+    """
+    Node values at `level` of a European lattice, read straight off the terminal values: each node is the
+    discounted expectation over the N - level steps below it, so no intermediate level is materialised
+
+    :param values: terminal node values, shape (..., N + 1)
+    :param pu: risk-neutral probability of an up move
+    :param disc: one-step discount factor
+    :param level: tree level to roll back to
+    :return: array of shape (..., level + 1)
+    """
+    n = values.shape[-1] - 1
+    width = n - level + 1
+    probs = terminal_probabilities(pu, n - level)
+    nodes = np.stack([np.sum(probs * values[..., i:i + width], axis=-1) for i in range(level + 1)], axis=-1)
+    nodes *= np.asarray(disc ** (n - level), dtype=np.float64)[..., None]
+    return nodes
+
+
+def trinomial_induction(values, pu, pm, pd, disc, scratch=None, exercise=None):
+    """
+    Roll trinomial node values back to the root in place. Level i has 2i + 1 nodes
+
+    :param values: float64 array of shape (..., 2N + 1) holding terminal node values, overwritten during the recursion
+    :param pu: probability of an up move
+    :param pm: probability of no move
+    :param pd: probability of a down move
+    :param disc: one-step discount factor
+    :param scratch: optional float64 buffer of shape (2, ..., 2N - 1), reused across steps
+    :param exercise: optional callable exercise(level, out) as in backward_induction
+    :return: value at the root node, shape values.shape[:-1]
+    """
+    n = (values.shape[-1] - 1) // 2
+    if scratch is None:
+        scratch = np.empty((2,) + values.shape[:-1] + (max(2 * n - 1, 1),), dtype=np.float64)
+    up_weight, mid_weight, down_weight = (np.asarray(disc * p, dtype=np.float64)[..., None] for p in (pu, pm, pd))
+    for i in range(n, 0, -1):
+        m = 2 * i - 1
+        # values[j] <- disc * (pd * values[j] + pm * values[j + 1] + pu * values[j + 2]) for j < 2i - 1
+        np.multiply(values[..., 2:m + 2], up_weight, out=scratch[0, ..., :m])
+        np.multiply(values[..., 1:m + 1], mid_weight, out=scratch[1, ..., :m])
+        scratch[0, ..., :m] += scratch[1, ..., :m]
+        values[..., :m] *= down_weight
+        values[..., :m] += scratch[0, ..., :m]
+        if exercise is not None:
+            exercise(i - 1, scratch[1])
+            np.maximum(values[..., :m], scratch[1, ..., :m], out=values[..., :m])
+    return values[..., 0]
+
+
+def dividend_escrow(dividends, T, rf, N):
+    """
+    Present value, at the time of every tree level, of the discrete dividends paid after that level and no later
+    than maturity (escrowed dividend model: the tree is built on the spot net of dividends, and this is added back
+    to get the stock price at a node)
+
+    :param dividends: iterable of (payment time in years, cash amount)
+    :param T: time to maturity (in years)
+    :param rf: risk-free rate
+    :param N: number of steps
+    :return: array of shape (..., N + 1), zero at maturity
+    """
+    T = np.asarray(T, dtype=np.float64)[..., None]
+    rf = np.asarray(rf, dtype=np.float64)[..., None]
+    times = np.arange(N + 1) * T / N
+    escrow = np.zeros(np.broadcast(times, rf).shape)
+    for pay_time, amount in dividends:
+        escrow += np.where((pay_time > times) & (pay_time <= T), amount * np.exp(-rf * (pay_time - times)), 0)
+    return escrow
+
+
+def _setup(s, k, T, rf, pcFlag, div, N, american, dividends):
+    escrow = dividend_escrow(dividends, T, rf, N) if dividends else np.zeros(np.shape(s) + (N + 1,))
+    s_net = s - escrow[..., 0]
+    # Without dividends an American call is never exercised early
+    if american and not dividends and np.all(div <= 0) and np.all(rf >= 0) and np.all(pcFlag > 0):
+        american = False
+    return escrow, s_net, np.asarray(k)[..., None], np.asarray(pcFlag)[..., None], american
+
+
+def _rollback(s, k, T, rf, vol, pcFlag, div, N, american, dividends, level, scheme):
+    # Node values of `level` on a binomial tree, together with the tree parameters needed to read Greeks off them
+    escrow, s_net, strike, flag, american = _setup(s, k, T, rf, pcFlag, div, N, american, dividends)
+    if scheme == 'lr':
+        u, d, pu, disc = leisen_reimer_factors(s_net, k, vol, T, rf, N, div)
+    else:
+        u, d, pu, disc = crr_factors(vol, T, rf, N, div)
+
+    if not american:
+        values = terminal_prices(s_net, u, d, N)
+        values -= strike
+        values *= flag
+        np.maximum(values, 0, out=values)
+        if level == 0:
+            values = np.sum(terminal_probabilities(pu, N) * values, axis=-1, keepdims=True) * \
+                     np.asarray(disc ** N)[..., None]
+        else:
+            values = rollback_european(values, pu, disc, level)
+        return values, (u, d, pu, disc, s_net, escrow, None)
+
+    # Node prices at level i are s_net * d^i * (u/d)^j; the j * log(u/d) ramp is computed once
+    log_s = np.log(s_net)[..., None]
+    log_d = np.log(d)[..., None]
+    ramp = np.arange(N + 1) * (np.log(u)[..., None] - log_d)
+
+    def exercise(i, out):
+        node = out[..., :i + 1]
+        np.add(ramp[..., :i + 1], log_s + i * log_d, out=node)
+        np.exp(node, out=node)
+        node += escrow[..., i:i + 1]
+        node -= strike
+        node *= flag
+
+    values = np.exp(ramp + log_s + N * log_d)
+    values -= strike
+    values *= flag
+    np.maximum(values, 0, out=values)
+    backward_induction(values, pu, disc, exercise=exercise, stop=level)
+    return values[..., :level + 1], (u, d, pu, disc, s_net, escrow, exercise)
+
+
+def _trinomial_price(s, k, T, rf, vol, pcFlag, div, N, american, dividends):
+    escrow, s_net, strike, flag, american = _setup(s, k, T, rf, pcFlag, div, N, american, dividends)
+    u, pu, pm, pd, disc = trinomial_factors(vol, T, rf, N, div)
+    # Node j of level i has price s_net * u^(j - i)
+    log_s = np.log(s_net)[..., None]
+    log_u = np.log(u)[..., None]
+    ramp = np.arange(2 * N + 1) * log_u
+
+    def exercise(i, out):
+        node = out[..., :2 * i + 1]
+        np.add(ramp[..., :2 * i + 1], log_s - i * log_u, out=node)
+        np.exp(node, out=node)
+        node += escrow[..., i:i + 1]
+        node -= strike
+        node *= flag
+
+    values = np.exp(ramp + log_s - N * log_u)
+    values -= strike
+    values *= flag
+    np.maximum(values, 0, out=values)
+    return trinomial_induction(values, pu, pm, pd, disc, exercise=exercise if american else None)
+
+
+def _lattice_price(s, k, T, rf, vol, pcFlag, div, N, american=False, dividends=None, scheme='crr'):
+    if scheme == 'trinomial':
+        return _trinomial_price(s, k, T, rf, vol, pcFlag, div, N, american, dividends)
+    values, _ = _rollback(s, k, T, rf, vol, pcFlag, div, N, american, dividends, 0, scheme)
+    return values[..., 0]
+
+
+def _lattice_greeks(s, k, T, rf, vol, pcFlag, div, N, american=False, dividends=None, scheme='crr'):
+    level2, (u, d, pu, disc, s_net, escrow, exercise) = _rollback(s, k, T, rf, vol, pcFlag, div, N, american,
+                                                                  dividends, 2, scheme)
+    # The last two backward steps on a 3-node buffer; its levels line up with the tree's levels 2, 1, 0
+    values = level2.copy()
+    backward_induction(values, pu, disc, exercise=exercise, stop=1)
+    level1 = values[..., :2].copy()
+    price = backward_induction(values[..., :2], pu, disc, exercise=exercise)
+
+    s_u, s_d = s_net * u + escrow[..., 1], s_net * d + escrow[..., 1]
+    s_uu, s_ud, s_dd = s_net * u * u + escrow[..., 2], s_net * u * d + escrow[..., 2], s_net * d * d + escrow[..., 2]
+    delta = (level1[..., 1] - level1[..., 0]) / (s_u - s_d)
+    gamma = ((level2[..., 2] - level2[..., 1]) / (s_uu - s_ud) - (level2[..., 1] - level2[..., 0]) / (s_ud - s_dd)) \
+            / (0.5 * (s_uu - s_dd))
+    # The middle level-2 node only sits at the spot when u * d = 1 (CRR); otherwise take out the price move first
+    move = s_ud - s
+    theta = (level2[..., 1] - price - delta * move - 0.5 * gamma * move * move) / (2 * T / N)
+    return np.stack([price, delta, gamma, theta], axis=-1)
+
+
+def _blockwise(func, N, *args, **kwargs):
+    # Broadcast the inputs, then evaluate func over blocks of at most MAX_LATTICE_NODES nodes
+    inputs = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in args))
+    shape = inputs[0].shape
+    if not shape:
+        return func(*inputs, N, **kwargs)
+
+    flat = [x.ravel() for x in inputs]
+    # American and trinomial trees keep a few buffers of up to 2N + 1 nodes per contract
+    block = max(1, MAX_LATTICE_NODES // (6 * N + 2))
+    results = [func(*(x[start:start + block] for x in flat), N, **kwargs) for start in range(0, flat[0].size, block)]
+    return np.concatenate(results, axis=0).reshape(shape + results[0].shape[1:])
+
+
+def lattice_price(s, k, T, rf, vol, N, pcFlag, div=0.0, american=False, dividends=None, scheme='crr'):
+    """
+    Price options on a recombining lattice. Array inputs are broadcast against each other and priced together,
+    in blocks of at most MAX_LATTICE_NODES nodes. American early exercise is a vectorized
+    np.maximum(continuation, intrinsic) at every level of the backward pass
+
+    :param s: spot price
+    :param k: strike price
+    :param T: time to maturity (in years)
+    :param rf: risk-free rate
+    :param vol: volatility of the underlying asset
+    :param N: number of steps
+    :param pcFlag: 1 for call -1 for put
+    :param div: continuous dividend yield
+    :param american: allow early exercise
+    :param dividends: optional discrete cash dividends, iterable of (payment time in years, amount)
+    :param scheme: 'crr' (Cox-Ross-Rubinstein), 'lr' (Leisen-Reimer, even N is bumped to N + 1) or 'trinomial'
+    :return: option price, float for scalar inputs or ndarray of the broadcast shape
+    """
+    N = _check_steps(N, 1, scheme)
+    price = _blockwise(_lattice_price, N, s, k, T, rf, vol, pcFlag, div, american=american,
+                       dividends=_dividend_list(dividends), scheme=scheme)
+    return float(price) if np.ndim(price) == 0 else price
+
+
+def lattice_estimate(s, k, T, rf, vol, N, pcFlag, div=0.0, american=False, dividends=None, scheme='crr',
+                     richardson=False):
+    """
+    Lattice price together with an estimate of its discretisation error. Leisen-Reimer converges smoothly as 1/N^2,
+    CRR and trinomial trees as 1/N. Without richardson the price is the N-step value and the error is
+    |P(N) - P(N/2)| / (2^order - 1); with richardson the N and 2N prices are extrapolated to
+    P(2N) + (P(2N) - P(N)) / (2^order - 1) and the error is the size of that correction. Arguments as in lattice_price
+
+    The error is only estimated for Leisen-Reimer: CRR and trinomial prices oscillate with the parity and position of
+    the strike between nodes, so the gap between two step counts can understate the true error several times over
+
+    :return: (price, error estimate), floats or ndarrays of the broadcast shape; the error is None unless scheme is 'lr'
+    """
+    N = _check_steps(N, 2, scheme)
+    order = 2 if scheme == 'lr' else 1
+    if richardson:
+        coarse = lattice_price(s, k, T, rf, vol, N, pcFlag, div, american, dividends, scheme)
+        fine = lattice_price(s, k, T, rf, vol, 2 * N, pcFlag, div, american, dividends, scheme)
+        correction = (fine - coarse) / (2 ** order - 1)
+        return fine + correction, np.abs(correction) if scheme == 'lr' else None
+    if scheme != 'lr':
+        return lattice_price(s, k, T, rf, vol, N, pcFlag, div, american, dividends, scheme), None
+    coarse = lattice_price(s, k, T, rf, vol, N // 2, pcFlag, div, american, dividends, scheme)
+    fine = lattice_price(s, k, T, rf, vol, N, pcFlag, div, american, dividends, scheme)
+    return fine, np.abs(fine - coarse) / (2 ** order - 1)
+
+
+def lattice_greeks(s, k, T, rf, vol, N, pcFlag, div=0.0, american=False, dividends=None, scheme='crr'):
+    """
+    Price, delta, gamma and theta read off the first two levels of the binomial tree used for the price,
+    so they cost one pass rather than one bumped tree per Greek. Arguments as in lattice_price
+
+    :param N: number of steps, at least 2
+    :param scheme: 'crr' or 'lr'
+    :return: dict of 'price', 'delta', 'gamma', 'theta' (per year), floats or ndarrays of the broadcast shape
+    """
+    if scheme not in ('crr', 'lr'):
+        raise Exception("Greeks are only available on binomial schemes", scheme)
+    N = _check_steps(N, 2, scheme)
+    result = _blockwise(_lattice_greeks, N, s, k, T, rf, vol, pcFlag, div, american=american,
+                        dividends=_dividend_list(dividends), scheme=scheme)
+    result = np.moveaxis(result, -1, 0)
+    return {name: float(value) if np.ndim(value) == 0 else value
+            for name, value in zip(['price', 'delta', 'gamma', 'theta'], result)}
+
+
+def _check_steps(N, minimum, scheme):
+    if scheme not in LATTICE_SCHEMES:
+        raise Exception("Invalid lattice scheme", scheme)
+    N = int(N)
+    if N < minimum:
+        raise Exception("Invalid steps", N)
+    if scheme == 'lr' and N % 2 == 0:
+        N += 1
+    return N
+
+
+def _dividend_list(dividends):
+    return [(float(pay_time), float(amount)) for pay_time, amount in dividends] if dividends else None
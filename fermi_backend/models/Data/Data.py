@@ -10,7 +10,9 @@ from yahoofinancials import YahooFinancials
 import datetime as dt
 import numpy as np
 import math
+import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from bdateutil import isbday
 from bdateutil import relativedelta
 
@@ -144,7 +146,10 @@ class FinanceData:
             localFile = pd.concat([localFile, missingComponents], axis=0).sort_index(ascending=True)
             localFile = localFile[~localFile.index.duplicated()]
             if (update):
-                localFile.to_csv(localCheck, index=True)
+                # Write aside and rename, so concurrent readers never see a half written file
+                tempPath = f'{localCheck}.{os.getpid()}.{threading.get_ident()}.tmp'
+                localFile.to_csv(tempPath, index=True)
+                os.replace(tempPath, localCheck)
             return localFile[startDate.isoformat():endDate.isoformat()]
 
         tables = []
@@ -270,6 +275,27 @@ class FinanceData:
 
         return df
 
+    def getVolsAndMarketCaps(self, tickerList, window=365, threads=16):
+        # retrieve volatility and market cap for every ticker concurrently
+        # ----Input-----
+        # tickerList: ticker names
+        # window: look back window to calculate volatility, default is 365 days
+        # threads: the number of threads to retrieve df
+        # ----output----
+        # DataFrame with Ticker, Vol and MarketCap columns, None where the retrieval failed
+        def tryFetch(func, ticker):
+            try:
+                return func(ticker)
+            except:
+                return None
+
+        tickerList = list(tickerList)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            vols = pool.map(lambda ticker: tryFetch(lambda x: float(self.getVol(x, window)), ticker), tickerList)
+            marketCaps = pool.map(lambda ticker: tryFetch(self.getMarketCap, ticker), tickerList)
+            vols, marketCaps = list(vols), list(marketCaps)
+        return pd.DataFrame({'Ticker': tickerList, 'Vol': vols, 'MarketCap': marketCaps})
+
     def dataMatching(self, df1, df2):
         # df1 and df2 should use date as index
         # dataFrame joins on right
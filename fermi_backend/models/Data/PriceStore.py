@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar on-disk price cache.
+
+The panel is one float64 file, a row per date and a column per ticker, opened as a read-only memmap, so a
+(tickers x dates) range query is a single slice. Next to it live the date index (int64 days) and meta.json, the ticker
+dictionary with the date ranges each ticker has been fetched over. New dates are appended at the end of the file and new
+tickers take spare columns, so the panel is only rewritten when it has to grow wider or take dates before or between
+the stored ones. A rewrite goes to a new generation of files and meta.json is replaced atomically, so readers always
+see a consistent panel; writers are serialized with a lock file.
+"""
+
+import datetime as dt
+import fcntl
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class PriceStore:
+    def __init__(self, root):
+        # ----Input-----
+        # root: directory of the store, created if missing
+        # ----output----
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def meta(self):
+        # Ticker dictionary {ticker: [column, [[first date, last date], ...]]} with the sorted, disjoint date ranges
+        # the ticker has been fetched over, panel shape and file generation
+        try:
+            with open(self.path('meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'generation': 0, 'rows': 0, 'width': 0, 'tickers': {}}
+
+    def dates(self, meta):
+        if meta['rows'] == 0:
+            return np.empty(0, dtype='datetime64[D]')
+        days = np.fromfile(self.path(f"dates.{meta['generation']}.i8"), dtype=np.int64, count=meta['rows'])
+        return days.astype('datetime64[D]')
+
+    def panel(self, meta, mode='r'):
+        if meta['rows'] * meta['width'] == 0:
+            return np.full((meta['rows'], meta['width']), np.nan)
+        return np.memmap(self.path(f"prices.{meta['generation']}.f8"), dtype=np.float64, mode=mode,
+                         shape=(meta['rows'], meta['width']))
+
+    def read(self, tickerList, startDate, endDate):
+        # Price table for the tickers between two dates (inclusive)
+        # ----Input-----
+        # tickerList: ticker names, tickers not in the store come back as empty columns
+        # startDate, endDate: datetime.date
+        # ----output----
+        # price table in pandas DataFrame format with date as index, dates where none of the tickers traded are dropped
+        meta = self.meta()
+        dates = self.dates(meta)
+        lo = np.searchsorted(dates, np.datetime64(startDate, 'D'), side='left')
+        hi = np.searchsorted(dates, np.datetime64(endDate, 'D'), side='right')
+        known = [ticker for ticker in tickerList if ticker in meta['tickers']]
+        columns = [meta['tickers'][ticker][0] for ticker in known]
+        values = np.take(self.panel(meta)[lo:hi], columns, axis=1)
+        table = pd.DataFrame(values, index=pd.DatetimeIndex(dates[lo:hi].astype('datetime64[ns]'), name='date'), columns=known)
+        return table.reindex(columns=list(tickerList)).dropna(how='all')
+
+    def missingRanges(self, ticker, startDate, endDate, meta=None):
+        # Dates to fetch so the ticker covers [startDate, endDate]
+        # ----Input-----
+        # meta: the store metadata, read from disk when not given
+        # ----output----
+        # list of (start, end) gaps between the ranges already fetched, empty if the ticker is covered
+        meta = self.meta() if meta is None else meta
+        gaps, cursor = [], startDate
+        covered = meta['tickers'][ticker][1] if ticker in meta['tickers'] else []
+        for first, last in covered:
+            first, last = dt.date.fromisoformat(first), dt.date.fromisoformat(last)
+            if last < cursor:
+                continue
+            if first > endDate:
+                break
+            if first > cursor:
+                gaps.append((cursor, first - dt.timedelta(days=1)))
+            cursor = last + dt.timedelta(days=1)
+        if cursor <= endDate:
+            gaps.append((cursor, endDate))
+        return gaps
+
+    @staticmethod
+    def cover(covered, startDate, endDate):
+        # Add [startDate, endDate] to the sorted ranges, merging ranges that overlap or touch
+        ranges = sorted(covered + [[startDate.isoformat(), endDate.isoformat()]])
+        merged = [ranges[0]]
+        for first, last in ranges[1:]:
+            if dt.date.fromisoformat(first) <= dt.date.fromisoformat(merged[-1][1]) + dt.timedelta(days=1):
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        return merged
+
+    def update(self, table, startDate, endDate):
+        # Write prices and record that their tickers are now covered from startDate up to the last date the table
+        # actually holds a price for (never today or later: today's close may not be published yet)
+        # ----Input-----
+        # table: price table with date as index and one column per ticker
+        # startDate, endDate: the range the table was fetched over
+        # ----output----
+        # the updated store metadata
+        with self.lock, open(self.path('lock'), 'w') as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            meta = self.meta()
+            dates = self.dates(meta)
+            newDates = np.unique(pd.DatetimeIndex(table.index).values.astype('datetime64[D]'))
+            lastClosed = min(endDate, dt.date.today() - dt.timedelta(days=1))
+            for ticker in table.columns:
+                if ticker not in meta['tickers']:
+                    meta['tickers'][ticker] = [len(meta['tickers']), []]
+                written = table[ticker].dropna().index
+                if len(written) == 0:
+                    continue
+                lastWritten = min(written.max().date(), lastClosed)
+                if startDate <= lastWritten:
+                    entry = meta['tickers'][ticker]
+                    entry[1] = PriceStore.cover(entry[1], startDate, lastWritten)
+
+            inserted = np.setdiff1d(newDates, dates)
+            if len(meta['tickers']) > meta['width'] or (len(dates) and len(inserted) and inserted[0] < dates[-1]):
+                self.rewrite(meta, dates, np.union1d(dates, newDates))
+            elif len(inserted):
+                self.append(meta, inserted)
+
+            dates = self.dates(meta)
+            panel = self.panel(meta, 'r+')
+            rows = np.searchsorted(dates, table.index.values.astype('datetime64[D]'))
+            columns = [meta['tickers'][ticker][0] for ticker in table.columns]
+            panel[rows[:, None], columns] = table.values
+            if isinstance(panel, np.memmap):
+                panel.flush()
+            self.writeMeta(meta)
+        return meta
+
+    def append(self, meta, newDates):
+        # New dates after the last stored one: extend both files in place, dropping any tail a crashed writer left
+        generation = meta['generation']
+        rows, width = meta['rows'], meta['width']
+        with open(self.path(f'dates.{generation}.i8'), 'ab') as f:
+            f.truncate(rows * 8)
+            f.write(newDates.astype(np.int64).tobytes())
+        with open(self.path(f'prices.{generation}.f8'), 'ab') as f:
+            f.truncate(rows * width * 8)
+            f.write(np.full((len(newDates), width), np.nan).tobytes())
+        meta['rows'] = rows + len(newDates)
+
+    def rewrite(self, meta, dates, allDates):
+        # Grow the panel into a new generation of files, doubling the width so new tickers rarely trigger this again
+        width = max(2 * meta['width'], len(meta['tickers']), 16) if len(meta['tickers']) > meta['width'] \
+            else meta['width']
+        panel = np.full((len(allDates), width), np.nan)
+        panel[np.searchsorted(allDates, dates), :meta['width']] = self.panel(meta)
+        generation = meta['generation'] + 1
+        allDates.astype(np.int64).tofile(self.path(f'dates.{generation}.i8'))
+        panel.tofile(self.path(f'prices.{generation}.f8'))
+        for name in (f"dates.{meta['generation'] - 1}.i8", f"prices.{meta['generation'] - 1}.f8"):
+            # The previous generation may still be mapped by a reader of the last meta.json, keep it one more round
+            if os.path.isfile(self.path(name)):
+                os.remove(self.path(name))
+        meta.update(generation=generation, rows=len(allDates), width=width)
+
+    def writeMeta(self, meta):
+        tempPath = self.path(f'meta.json.{os.getpid()}.tmp')
+        with open(tempPath, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tempPath, self.path('meta.json'))
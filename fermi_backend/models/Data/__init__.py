@@ -2,3 +2,4 @@ __author__ = "Kaihua(William) Huang (khuang41@fordham.edu)"
 __version__ = "1.0.1"
 
 from .Data import FinanceData
+from .PriceStore import PriceStore
@@ -5,74 +5,263 @@ Created on Wed Aug  1 11:05:32 2018
 @author: kaihu
 """
 
-from models.Binomial.BinomialTree import BinomialTree
+from ..Binomial.BinomialTree import BinomialTree
+from ..Binomial.lattice import terminal_prices, backward_induction
+from concurrent.futures import ProcessPoolExecutor
+import math
 import numpy as np
-from scipy.optimize import root
+import pandas as pd
+from scipy.optimize import brentq
+from scipy.special import ndtr
+
+GESKE_METHODS = ('auto', 'closed', 'lattice', 'check')
+# 20-point Gauss-Legendre rule on [-1, 1] for the bivariate normal integrals
+_GL_NODES, _GL_WEIGHTS = np.polynomial.legendre.leggauss(20)
+
+
+def bivariateNormalCdf(x, y, rho):
+    # P(X < x, Y < y) for standard normals with correlation rho, Genz's (2004) version of the Drezner-Wesolowsky
+    # algorithm, accurate to ~1e-15. Vectorised over x and y for a scalar rho
+    h, k = np.broadcast_arrays(-np.asarray(x, dtype=np.float64), -np.asarray(y, dtype=np.float64))
+    hk = h * k
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        if abs(rho) < 0.925:
+            hs = (h * h + k * k) / 2
+            asr = math.asin(rho) / 2
+            sn = np.sin(asr * (1 + _GL_NODES))
+            terms = np.exp((sn * hk[..., None] - hs[..., None]) / (1 - sn * sn))
+            return np.clip(asr / (2 * np.pi) * (terms @ _GL_WEIGHTS) + ndtr(-h) * ndtr(-k), 0, 1)
+
+        if rho < 0:
+            k, hk = -k, -hk
+        bvn = np.zeros(h.shape)
+        if abs(rho) < 1:
+            ass = 1 - rho * rho
+            a = math.sqrt(ass)
+            bs = (h - k) ** 2
+            asr = -(bs / ass + hk) / 2
+            c = (4 - hk) / 8
+            d = (12 - hk) / 80
+            bvn = np.where(asr > -100, a * np.exp(asr) * (1 - c * (bs - ass) * (1 - d * bs / 5) / 3 + c * d * ass * ass / 5), 0)
+            b = np.sqrt(bs)
+            sp = math.sqrt(2 * np.pi) * ndtr(-b / a)
+            bvn -= np.where(hk > -100, np.exp(-hk / 2) * sp * b * (1 - c * bs * (1 - d * bs / 5) / 3), 0)
+            xs = (a / 2 * (1 + _GL_NODES)) ** 2
+            rs = np.sqrt(1 - xs)
+            terms = np.exp(-bs[..., None] / (2 * xs) - hk[..., None] / (1 + rs)) / rs \
+                    - np.exp(-(bs[..., None] / xs + hk[..., None]) / 2) * (1 + c[..., None] * xs * (1 + d[..., None] * xs))
+            bvn = -(bvn + a / 2 * (terms @ _GL_WEIGHTS)) / (2 * np.pi)
+        if rho > 0:
+            bvn = bvn + ndtr(-np.maximum(h, k))
+        else:
+            gap = np.where(h < 0, ndtr(k) - ndtr(h), ndtr(-h) - ndtr(-k))
+            bvn = np.where(h >= k, -bvn, gap - bvn)
+    return np.clip(bvn, 0, 1)
 
 
 class Geske(BinomialTree):
     'ttm and debt are array'
 
-    def __init__(self, s0, ttm, Debt):
-        super().__init__()
+    def __init__(self, s0, ttm, Debt, rf=0.05, steps=50, vol=0.2):
+        if len(ttm) != len(Debt):
+            raise Exception("ttm and Debt length doesn't match", len(ttm), len(Debt))
+        if any(np.diff(ttm) <= 0):
+            raise Exception("ttm must be increasing", ttm)
+        # The tree spans the last debt payment
+        super().__init__(rf, steps, vol, ttm[-1])
         self.s0 = s0
         self.ttm = ttm
         self.debt = Debt
 
-    def geske(self):
-        index = len(self.ttm) - 1
-        self.Tree(s0=self.s0, func=BinomialTree.optionExercise(self, k=self.debt[index]))
+    def latticeValues(self, s0, survival=False):
+        # Equity value (the compound call on the firm's assets) for every candidate asset value in s0 in one backward
+        # pass over a (len(s0), steps + 1) lattice instead of one tree per asset value. With survival, the
+        # probability of meeting every payment is carried alongside as a second row of a (2, len(s0), steps + 1)
+        # lattice, so both roll back in the same pass: equity is discounted, the probability is not
+        # ----output----
+        # array of shape (1, len(s0)), or (2, len(s0)) with survival: equity row, then survival probability row
+        s0 = np.atleast_1d(np.asarray(s0, dtype=np.float64))
+        rows = 2 if survival else 1
+        values = np.empty((rows, len(s0), self.steps + 1), dtype=np.float64)
+        values[0] = terminal_prices(s0, self.up, self.dn, self.steps) - self.debt[-1]
+        if survival:
+            values[1] = values[0] > 0
+        np.maximum(values[0], 0, out=values[0])
+        scratch = np.empty((rows, len(s0), self.steps), dtype=np.float64)
+        disc = np.array([1 / self.rh, 1.0][:rows])[:, None]
 
-        index -= 1
-        while index >= 0:
+        for index in range(len(self.ttm) - 2, -1, -1):
             strike_step = int(self.ttm[index] / self.ttm[-1] * self.steps)
-            while self.currStep > strike_step + 1:
-                self.reverse()
+            backward_induction(values, self.pr, disc, scratch, stop=strike_step)
+            values = values[..., :strike_step + 1]
+            # Pay the debt due at this date only if the firm is worth more than it, otherwise default
+            values[0] -= self.debt[index]
+            if survival:
+                values[1] *= values[0] > 0
+            np.maximum(values[0], 0, out=values[0])
 
-            self.reverse(func=BinomialTree.optionExercise(self, k=self.debt[index]))
+        return backward_induction(values, self.pr, disc, scratch).copy()
 
-            index = index - 1
+    def equityCurve(self, s0):
+        return self.latticeValues(s0)[0]
 
-        return self.reverseToBeginning()
+    def criticalAssetValue(self):
+        # Asset value at the first payment date at which the equity (a call on the firm expiring at the second
+        # payment) is worth exactly the first payment; below it the shareholders default. Cached on the inputs
+        key = (self.rf, self.vol, tuple(self.ttm), tuple(self.debt))
+        if getattr(self, 'criticalCache', (None,))[0] == key:
+            return self.criticalCache[1]
+        t1, t2 = self.ttm
+        d1, d2 = self.debt
+        tau = t2 - t1
+        sig = self.vol * math.sqrt(tau)
 
-    def probOverride(self, optionValue):
-        if optionValue > 0:
-            return 1.0
-        else:
-            return 0.0
+        def callMinusDebt(v):
+            x = (math.log(v / d2) + (self.rf + self.vol * self.vol / 2) * tau) / sig
+            return v * ndtr(x) - d2 * math.exp(-self.rf * tau) * ndtr(x - sig) - d1
+
+        hi = d1 + d2
+        while callMinusDebt(hi) < 0:
+            hi *= 2
+        self.criticalCache = (key, brentq(callMinusDebt, d1, hi, xtol=1e-14))
+        return self.criticalCache[1]
+
+    def closedForm(self, s0=None):
+        # Geske (1979) compound-option value of equity with two debt payments and the risk-neutral probability of
+        # defaulting on either of them: E = V M(a1, b1; rho) - D2 e^-rT2 M(a2, b2; rho) - D1 e^-rT1 N(a2)
+        # ----Input-----
+        # s0: firm asset value(s), defaults to self.s0
+        # ----output----
+        # (equity value, default probability)
+        if len(self.ttm) != 2:
+            raise Exception("Closed form needs exactly two debt payments", len(self.ttm))
+        v = np.asarray(self.s0 if s0 is None else s0, dtype=np.float64)
+        t1, t2 = self.ttm
+        d1, d2 = self.debt
+        sig1, sig2 = self.vol * math.sqrt(t1), self.vol * math.sqrt(t2)
+        drift = self.rf + self.vol * self.vol / 2
+        a1 = (np.log(v / self.criticalAssetValue()) + drift * t1) / sig1
+        b1 = (np.log(v / d2) + drift * t2) / sig2
+        rho = math.sqrt(t1 / t2)
+
+        survival = bivariateNormalCdf(a1 - sig1, b1 - sig2, rho)
+        equity = v * bivariateNormalCdf(a1, b1, rho) - d2 * math.exp(-self.rf * t2) * survival \
+                 - d1 * math.exp(-self.rf * t1) * ndtr(a1 - sig1)
+        return equity, 1 - survival
+
+    def resolveMethod(self, method):
+        # 'auto' uses the closed form for two debt payments and the lattice otherwise
+        if method not in GESKE_METHODS:
+            raise Exception("Invalid method", method)
+        if method == 'auto':
+            return 'closed' if len(self.ttm) == 2 else 'lattice'
+        return method
+
+    def geske(self, method='auto'):
+        # Equity value at s0. method: 'auto', 'closed', 'lattice', or 'check' which returns both and their difference
+        method = self.resolveMethod(method)
+        if method == 'check':
+            closed, lattice = float(self.closedForm()[0]), float(self.equityCurve(self.s0)[0])
+            return {'closed': closed, 'lattice': lattice, 'difference': lattice - closed}
+        if method == 'closed':
+            return float(self.closedForm()[0])
+        return float(self.equityCurve(self.s0)[0])
 
     def errorFunc(self, marketCap):
-        return lambda x: self.geske() - marketCap
+        return lambda x: self.equityCurve(x) - marketCap
 
-    def getAssetPrice(self, marketCap):
-        result = root(self.errorFunc(marketCap=marketCap), np.array([sum(self.debt) * 1.1]))
-        return result.x[0]
+    def getAssetPrice(self, marketCap, gridSize=33, tol=1e-8, maxPasses=4, method='auto'):
+        # Asset value whose equity matches the market cap. Equity is increasing in the asset value and lies between
+        # V - sum(Debt) and V, so [marketCap, marketCap + sum(Debt)] brackets the root. Each pass prices a whole grid
+        # in one batched lattice and narrows the bracket to one grid cell; brentq then solves on the interpolated
+        # curve of the last grid, which is exact between kinks since the lattice equity is piecewise linear in s0.
+        # With the closed form brentq runs on the formula directly
+        method = self.resolveMethod(method)
+        lo, hi = marketCap, marketCap + sum(self.debt)
+        if method == 'check':
+            closed = self.getAssetPrice(marketCap, method='closed')
+            lattice = self.getAssetPrice(marketCap, gridSize, tol, maxPasses, method='lattice')
+            return {'closed': closed, 'lattice': lattice, 'difference': lattice - closed}
+        if method == 'closed':
+            while self.closedForm(hi)[0] < marketCap:
+                lo, hi = hi, 2 * hi
+            return brentq(lambda x: self.closedForm(x)[0] - marketCap, lo, hi)
+        while self.equityCurve(hi)[0] < marketCap:
+            # Only possible with negative rates, widen upwards before the passes so the last grid holds the root
+            lo, hi = hi, 2 * hi
+        for _ in range(maxPasses):
+            grid = np.linspace(lo, hi, gridSize)
+            equity = self.equityCurve(grid)
+            i = min(max(int(np.searchsorted(equity, marketCap)), 1), gridSize - 1)
+            lo, hi = grid[i - 1], grid[i]
+            if hi - lo <= tol * hi:
+                break
+        return brentq(lambda x: np.interp(x, grid, equity) - marketCap, lo, hi)
 
-    def reverseProb(self, func=None):
-        if func is not None:
-            self.prob = np.array((list(map(func, self.options))))
-            return
+    def calculateProb(self, method='auto'):
+        # Risk-neutral probability of defaulting on any debt payment. method: 'auto', 'closed', 'lattice', or
+        # 'check' which returns both and their difference
+        method = self.resolveMethod(method)
+        if method == 'check':
+            closed, lattice = self.calculateProb('closed'), self.calculateProb('lattice')
+            return {'closed': closed, 'lattice': lattice, 'difference': lattice - closed}
+        if method == 'closed':
+            return float(self.closedForm()[1])
+        return float(1 - self.latticeValues(self.s0, survival=True)[1, 0])
 
-        last_step_prob = self.prob.copy()
-        for i in range(self.currStep + 1):
-            self.prob[i] = (last_step_prob[i + 1] * self.pr + last_step_prob[i] * (1 - self.pr)) / self.rh
+    def creditRisk(self, marketCap, method='auto'):
+        # Calibrate the firm to its market cap and value it: the asset value matching the market cap, then equity
+        # and default probability from a single fused pass (or the closed form) at that asset value
+        # ----Input-----
+        # marketCap: market value of equity, in the same unit as Debt
+        # method: 'auto', 'closed' or 'lattice'
+        # ----output----
+        # dict of 'Asset Price', 'Equity' and 'Default Prob'; s0 is set to the calibrated asset value
+        method = self.resolveMethod(method)
+        if method == 'check':
+            raise Exception("Invalid method", method)
+        self.s0 = self.getAssetPrice(marketCap, method=method)
+        if method == 'closed':
+            equity, default = self.closedForm()
+        else:
+            equity, survival = self.latticeValues(self.s0, survival=True)[:, 0]
+            default = 1 - survival
+        return {'Asset Price': self.s0, 'Equity': float(equity), 'Default Prob': float(default)}
 
-    def calculateProb(self):
 
-        index = len(self.ttm) - 1
-        self.Tree(s0=self.s0, func=BinomialTree.optionExercise(self, k=self.debt[index]))
-        self.prob = np.array((list(map(self.probOverride, self.options))))
-        index = index - 1
-        while index >= 0:
-            strike_step = int(self.ttm[index] / self.ttm[-1] * self.steps)
-            while self.currStep > strike_step + 1:
-                self.reverse()
-                self.reverseProb()
-            self.reverse(func=BinomialTree.optionExercise(self, k=self.debt[index]))
-            self.reverseProb(func=self.probOverride)
-            index = index - 1
-
-        while self.currStep > 0:
-            self.reverse()
-            self.reverseProb()
-        return 1 - self.prob[0]
+def solveFirm(firm):
+    # One row of the credit-risk table; module level so it can be shipped to a worker process
+    # ----Input-----
+    # firm: (ticker, ttm, Debt, vol, marketCap, rf, steps, method)
+    # ----output----
+    # dict with the firm inputs, 'Asset Price', 'Equity', 'Default Prob' and 'Error' (None when solved)
+    ticker, ttm, Debt, vol, marketCap, rf, steps, method = firm
+    row = {'Ticker': ticker, 'Vol': vol, 'Market Cap': marketCap, 'Asset Price': None, 'Equity': None,
+           'Default Prob': None, 'Error': None}
+    try:
+        if vol is None or marketCap is None or not (vol > 0 and marketCap > 0):
+            raise Exception("Missing volatility or market cap", vol, marketCap)
+        row.update(Geske(marketCap, ttm, Debt, rf=rf, steps=steps, vol=vol).creditRisk(marketCap, method))
+    except Exception as e:
+        row['Error'] = str(e)
+    return row
+
+
+def creditRiskTable(firms, rf=0.05, steps=200, method='auto', processes=None):
+    # Calibrate a whole universe of firms, spread over a process pool
+    # ----Input-----
+    # firms: iterable of (ticker, ttm, Debt, vol, marketCap), debt and market cap in the same unit
+    # rf: risk free rate
+    # steps: lattice steps, only used by the lattice method
+    # method: 'auto', 'closed' or 'lattice'
+    # processes: number of worker processes, None or 1 solves in-process
+    # ----output----
+    # DataFrame with one row per firm, failed firms keep their inputs and an 'Error' message
+    specs = [(ticker, ttm, Debt, vol, marketCap, rf, steps, method) for ticker, ttm, Debt, vol, marketCap in firms]
+    if processes is not None and processes > 1 and len(specs) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            rows = list(pool.map(solveFirm, specs, chunksize=max(1, len(specs) // (4 * processes))))
+    else:
+        rows = list(map(solveFirm, specs))
+    return pd.DataFrame(rows, columns=['Ticker', 'Vol', 'Market Cap', 'Asset Price', 'Equity', 'Default Prob',
+                                       'Error'])
@@ -19,7 +19,7 @@ from models.VaR.PCAVaR import PCAVaR
 from models.Liquidity.Liquidity import Liquidity
 from models.Geske.Geske import Geske
 from models.Data.Data import FinanceData
-from .utils import getPriceTableFromFileCache
+from .utils import getPriceTableFromFileCache, getFactorModel
 
 import numpy as np
 import pandas as pd
@@ -52,8 +52,6 @@ class Homework:
 
 
 		result = {}
-		paraDict = {}
-		hisDict = {}
 		weight = np.array(weight)
 		priceTabel = self.dataSource.getPriceTable(tickerList,startDate.isoformat(),endDate.isoformat())
 		while(len(priceTabel) < historicalWindow):
@@ -61,13 +59,11 @@ class Homework:
 			priceTabel = self.dataSource.getPriceTable(tickerList, startDate.isoformat(), endDate.isoformat())
 		parametric = ValueAtRisk(0.95,priceTabel.as_matrix(),weight)
 		historical = HistoricalVaR(0.95,priceTabel.as_matrix(),weight)
-		for interval in intervals:
-			parametric.setCI(interval)
-			historical.setCI(interval)
-			key = interval
-			# the 1 here means daily var
-			paraDict[key] = parametric.var(marketValue=notional,window = 1)
-			hisDict[key] = historical.var(marketValue=notional,window = historicalWindow)
+		# Every confidence level in one pass, the 1 here means daily var
+		parametric.setCI(intervals)
+		historical.setCI(intervals)
+		paraDict = dict(zip(intervals, parametric.var(marketValue=notional,window = 1).tolist()))
+		hisDict = dict(zip(intervals, historical.var(marketValue=notional,window = historicalWindow).tolist()))
 		result['Parametric'] = paraDict
 		result['Historical'] = hisDict
 		result['Cov-Var Matrix'] = parametric.covMatrix()
@@ -79,10 +75,9 @@ class Homework:
 		vol = self.dataSource.getVol(ticker)
 		marketCap = self.dataSource.getMarketCap(ticker)
 		marketCap = marketCap/1000000000
-		GDemo = Geske(rf=rf,steps=steps,vol=vol,ttm=ttm[-1])
-		result = {}
-		result['Asset Price'] = GDemo.getAssetPrice(ttm,Debt,marketCap)
-		result['Default Prob'] = GDemo.calculateProb(s0=result['Asset Price'],ttm = ttm,Debt = Debt)
+		GDemo = Geske(marketCap,ttm,Debt,rf=rf,steps=steps,vol=vol)
+		# Asset price, equity and default probability in one calibration
+		result = GDemo.creditRisk(marketCap)
 		result['Market Cap'] = marketCap
 		return result
 
@@ -106,8 +101,8 @@ class Homework:
 			illquidA0 = Liquidity.illquidPrice(W,W*adjustFactor,t1,rf,sharpRatio,0.3)
 			LDemo = Liquidity(k = 1, rf = rf, steps = steps, vol = vol, ttm = t1)
 			LDemo.liquidPrice(s0 = illquidA0,k1= k1,k2 = k2,t1 = t1, t2 = t2,div = div)
-			GDemo = Geske(rf=rf,steps=steps,vol=vol,ttm=t2)
-			illquidE0 = GDemo.geske(illquidA0,ttm,Debt)
+			GDemo = Geske(illquidA0,ttm,Debt,rf=rf,steps=steps,vol=vol)
+			illquidE0 = GDemo.geske()
 		except:
 			return None
 		result['Illiquid Asset'] = illquidA0
@@ -143,9 +138,6 @@ class Homework:
 
 
 		result = {}
-		paraDict = {}
-		hisDict = {}
-		pcaDict = {}
 		priceTabel = getPriceTableFromFileCache(tickerList, startDate, endDate)
 		naCheck = np.all(priceTabel.isna(),axis=0).values
 		if True in naCheck:
@@ -168,25 +160,17 @@ class Homework:
 		parametric = ValueAtRisk(0.95,priceTabel.as_matrix(),weight)
 		historical = HistoricalVaR(0.95,priceTabel.as_matrix(),weight)
 
-		universeTickerList = pd.read_csv('/university_code/VaR/Data/universeTickerList.csv', names=['ticker'])['ticker'].tolist()
-
-		universePriceTabel = self.dataSource.getPriceTable(universeTickerList,startDate.isoformat(),endDate.isoformat(), \
-            localCheck='/university_code/VaR/Data/universe.csv', update=True)
-		logging.debug(f'{universePriceTabel.index}')
-		universePriceTabel = self.dataSource.dataMatching(universePriceTabel,priceTabel)
-		# universePriceTabel = universePriceTabel.iloc[universePriceTabel.shape[0]-priceTabel.shape[0]:]
-
-		pcafactor = PCAVaR(0.95,priceTabel.as_matrix(),universePriceTabel,weight)
-		pcafactor.getComponents(5)
-		for interval in intervals:
-			parametric.setCI(interval)
-			historical.setCI(interval)
-			pcafactor.setCI(interval)
-			key = interval
-			# the 1 here means daily var
-			paraDict[key] = parametric.var(marketValue=notional,window = 1)
-			hisDict[key] = historical.var(marketValue=notional,window = historicalWindow)
-			pcaDict[key] = pcafactor.var(marketValue=notional)
+		# The universe PCA factor model is shared by every call over the same window, built once a day
+		factorModel = getFactorModel(startDate, endDate, 5, self.dataSource)
+		pcaPriceTabel = priceTabel.reindex(factorModel['dates']).ffill()
+		pcafactor = PCAVaR(0.95,pcaPriceTabel.values,weights=weight,factorModel=factorModel)
+		# Every confidence level in one pass, the 1 here means daily var
+		parametric.setCI(intervals)
+		historical.setCI(intervals)
+		pcafactor.setCI(intervals)
+		paraDict = dict(zip(intervals, parametric.var(marketValue=notional,window = 1).tolist()))
+		hisDict = dict(zip(intervals, historical.var(marketValue=notional,window = historicalWindow).tolist()))
+		pcaDict = dict(zip(intervals, pcafactor.var(marketValue=notional).tolist()))
 		result['Parametric'] = paraDict
 		result['Historical'] = hisDict
 		result['PCAFactor'] = pcaDict
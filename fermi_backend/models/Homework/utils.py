@@ -1,25 +1,114 @@
 from models.Data.Data import FinanceData
+from models.Data.PriceStore import PriceStore
+from models.VaR.PCAVaR import PCAVaR
 
+import fcntl
+import glob
 import os.path
+import threading
+import numpy as np
 import pandas as pd
 
 
 #BASE_DIR = 'F://Server Code//university_code'
+DATA_DIR = '/university_code/VaR/Data'
+UNIVERSE_TICKERS = os.path.join(DATA_DIR, 'universeTickerList.csv')
+UNIVERSE_PRICES = os.path.join(DATA_DIR, 'universe.csv')
+PRICE_STORE = os.path.join(DATA_DIR, 'prices')
+FACTOR_MODEL_ARRAYS = ('dates', 'components', 'factorMatrix', 'factorCovVarMat')
+FACTOR_MODEL_MEMO_SIZE = 8
+# Artifacts kept on disk, the oldest are removed after each build
+FACTOR_MODEL_ARTIFACTS = 4
+FACTOR_MODEL_LOCK = os.path.join(DATA_DIR, 'factorModel.lock')
+
+_factorModels = {}
+_factorModelLock = threading.Lock()
+
+
 def getPriceTableFromFileCache(tickerList, startDate, endDate):
-    df = pd.DataFrame()
+    # Price table from the columnar cache, fetching only the dates each ticker is missing. Tickers still in the old
+    # one-CSV-per-ticker cache are imported into the store the first time they are asked for
+    store = PriceStore(PRICE_STORE)
+    meta = store.meta()
     dataSource = FinanceData('Yahoo')
     for ticker in tickerList:
-        file_path = '/university_code/VaR/Data/{}.csv'.format(ticker) # pending
-        if os.path.isfile(file_path):
-            temp_df = dataSource.getPriceTable([ticker], startDate.isoformat(), endDate.isoformat(), localCheck=file_path, update=True)
-        else:
-            temp_df = dataSource.getPriceTable([ticker], startDate.isoformat(), endDate.isoformat())
+        file_path = os.path.join(DATA_DIR, '{}.csv'.format(ticker))
+        if ticker not in meta['tickers'] and os.path.isfile(file_path):
+            temp_df = pd.read_csv(file_path, index_col='date', parse_dates=True)
+            if len(temp_df):
+                meta = store.update(temp_df[[ticker]], temp_df.index[0].date(), temp_df.index[-1].date())
+
+        for fetchStart, fetchEnd in store.missingRanges(ticker, startDate, endDate, meta):
+            temp_df = dataSource.getPriceTable([ticker], fetchStart.isoformat(), fetchEnd.isoformat())
             if(len(temp_df)):
-                temp_df.to_csv(file_path, index=True)
+                meta = store.update(temp_df, fetchStart, fetchEnd)
+
+    return store.read(tickerList, startDate, endDate)
+
+
+def factorModelPath(startDate, endDate, n_components):
+    return os.path.join(DATA_DIR, f'factorModel_{startDate.isoformat()}_{endDate.isoformat()}_{n_components}.npz')
+
+
+def buildFactorModel(startDate, endDate, n_components=5, dataSource=None, overwrite=True):
+    # Fetch the universe panel once and save its PCA factor model as an npz artifact. Builds are serialized across
+    # processes with a lock file, which also guards the universe.csv update; the artifact is written under a temporary
+    # name and renamed, so readers never see a partial file. Only the newest FACTOR_MODEL_ARTIFACTS are kept
+    path = factorModelPath(startDate, endDate, n_components)
+    with open(FACTOR_MODEL_LOCK, 'w') as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        if not overwrite and os.path.isfile(path):
+            # Built by another worker while this one waited
+            return path
+        dataSource = FinanceData('Yahoo') if dataSource is None else dataSource
+        universeTickerList = pd.read_csv(UNIVERSE_TICKERS, names=['ticker'])['ticker'].tolist()
+        universePriceTabel = dataSource.getPriceTable(universeTickerList, startDate.isoformat(), endDate.isoformat(),
+                                                      localCheck=UNIVERSE_PRICES, update=True)
+        if universePriceTabel.shape[1] < n_components:
+            raise Exception("Too many PCA Components")
+        universeReturnMatrix = np.nan_to_num(np.diff(np.log(universePriceTabel.values), axis=0))
+        factorModel = PCAVaR.fitFactorModel(universeReturnMatrix, n_components)
+        # Price dates: the factor returns are the moves between consecutive ones
+        factorModel['dates'] = universePriceTabel.index.values.astype('datetime64[ns]')
+
+        tempPath = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tempPath, 'wb') as f:
+            np.savez(f, **{name: factorModel[name] for name in FACTOR_MODEL_ARRAYS})
+        os.replace(tempPath, path)
+
+        artifacts = sorted(glob.glob(os.path.join(DATA_DIR, 'factorModel_*.npz')), key=os.path.getmtime)
+        for oldPath in artifacts[:-FACTOR_MODEL_ARTIFACTS]:
+            if oldPath != path:
+                os.remove(oldPath)
+    return path
+
+
+def loadFactorModel(startDate, endDate, n_components=5, dataSource=None):
+    # Read-only arrays of the window's artifact, built first if no worker has done it yet
+    path = factorModelPath(startDate, endDate, n_components)
+    try:
+        artifact = np.load(path)
+    except FileNotFoundError:
+        buildFactorModel(startDate, endDate, n_components, dataSource, overwrite=False)
+        artifact = np.load(path)
+    with artifact:
+        factorModel = {name: artifact[name] for name in FACTOR_MODEL_ARRAYS}
+    for array in factorModel.values():
+        array.flags.writeable = False
+    factorModel['dates'] = pd.DatetimeIndex(factorModel['dates'])
+    return factorModel
 
-        if df.shape[0] == 0:
-            df = temp_df.copy()
-        else:
-            df = df.join(temp_df,how='outer')
 
-    return df
+def getFactorModel(startDate, endDate, n_components=5, dataSource=None):
+    # PCA factor model of the universe over [startDate, endDate]: built once per window (so once per trading day for
+    # the default Game window) and loaded read-only by every PCA VaR call. The loaded arrays are memoized per process;
+    # the lock only guards the memo, so building or loading a model doesn't hold up other requests
+    key = (startDate, endDate, n_components)
+    with _factorModelLock:
+        if key in _factorModels:
+            return _factorModels[key]
+    factorModel = loadFactorModel(startDate, endDate, n_components, dataSource)
+    with _factorModelLock:
+        if len(_factorModels) >= FACTOR_MODEL_MEMO_SIZE:
+            _factorModels.pop(next(iter(_factorModels)))
+        return _factorModels.setdefault(key, factorModel)
@@ -5,37 +5,36 @@ Created on Fri Aug 10 10:26:51 2018
 @author: William Huang
 """
 
-from scipy.special import comb
-from models.Binomial.BinomialTree import BinomialTree
+from ..Binomial.BinomialTree import BinomialTree
+from ..Binomial.lattice import terminal_prices, terminal_probabilities
 from scipy.stats import norm
-from scipy.optimize import root
 from scipy.optimize import brentq
+from scipy.special import ndtr
 import numpy as np
-import logging
 import math
 
 
 def BSPricer(s, k, rf, div, vol, T, pcFlag):
-    d1 = (math.log(s / k) + (rf - div + vol * vol / 2) * T) / (vol * math.sqrt(T))
-    d2 = d1 - vol * math.sqrt(T)
+    # Black-Scholes price, every input may be an array (broadcast against each other)
+    d1 = (np.log(s / k) + (rf - div + vol * vol / 2) * T) / (vol * np.sqrt(T))
+    d2 = d1 - vol * np.sqrt(T)
 
     n1 = norm.cdf(d1 * pcFlag, 0, 1)
     n2 = norm.cdf(d2 * pcFlag, 0, 1)
-    result = s * math.exp(-div * T) * pcFlag * n1 - k * math.exp(-rf * T) * pcFlag * n2
+    result = s * np.exp(-div * T) * pcFlag * n1 - k * np.exp(-rf * T) * pcFlag * n2
 
     return result
 
 
-def BSPricer_calibrate(s, rf, div, vol, T, pcFlag, adjustmentFactor, equityMarket) -> float:
-    # logging.debug(f'{s},{k}')
-    d1 = (math.log(s / s * adjustmentFactor) + (rf - div + vol * vol / 2) * T) / (vol * math.sqrt(T))
-    d2 = d1 - vol * math.sqrt(T)
+def BSPricer_calibrate(s, rf, div, vol, T, pcFlag, adjustmentFactor, equityMarket):
+    # Call on the firm wealth s struck at s * adjustmentFactor, less the market equity. Every input may be an array
+    d1 = (np.log(s / (s * adjustmentFactor)) + (rf - div + vol * vol / 2) * T) / (vol * np.sqrt(T))
+    d2 = d1 - vol * np.sqrt(T)
 
     n1 = norm.cdf(d1 * pcFlag, 0, 1)
     n2 = norm.cdf(d2 * pcFlag, 0, 1)
-    result = s * math.exp(-div * T) * pcFlag * n1 - s * adjustmentFactor * math.exp(
+    result = s * np.exp(-div * T) * pcFlag * n1 - s * adjustmentFactor * np.exp(
         -rf * T) * pcFlag * n2 - equityMarket
-    # logging.debug(f'-> {result}')
 
     return result
 
@@ -57,35 +56,57 @@ class Liquidity(BinomialTree):
         return (mu - rf) / vol
 
     def calculateBeta(self, stk0, opt0, endOptPrice, n):
-        # Initialize
-        sum_opt_price, sum_opt_return, sum_stk_return, crss_opt_stk, sum2_stk_return = 0, 0, 0, 0, 0
-
-        for j in range(n):
-            stk_return = math.pow(self.up, j) * math.pow(self.dn, (n - j))
-            opt_return = endOptPrice[j] / opt0
-            prob = comb(n, j) * math.pow(self.pr, j) * math.pow((1 - self.pr), (n - j))
-            sum_opt_price = sum_opt_price + endOptPrice[j] * prob
-            sum_opt_return = sum_opt_return + opt_return * prob
-            sum_stk_return = sum_stk_return + stk_return * prob
-            crss_opt_stk = crss_opt_stk + opt_return * stk_return * prob
-            sum2_stk_return = sum2_stk_return + stk_return * stk_return * prob
-        cov = crss_opt_stk - sum_stk_return * sum_opt_return
-        var_stk_return = sum2_stk_return - sum_stk_return * sum_stk_return
-        # Equation 22 in paper
+        # Beta of the option return on the stock return over n steps (Equation 22 in paper), from the moments over
+        # all n + 1 terminal nodes at once. Binomial weights are computed in log space so large n doesn't overflow.
+        # Batched form: opt0 as an array with endOptPrice of shape (len(opt0), n + 1) returns one beta per option
+        # ----Input-----
+        # stk0: initial stock price (returns are relative, so it doesn't enter the moments)
+        # opt0: initial option price(s)
+        # endOptPrice: option prices at the n + 1 terminal nodes, lowest node first, one row per option
+        # n: number of steps
+        # ----output----
+        # beta, or an array of betas
+        endOptPrice = np.asarray(endOptPrice, dtype=np.float64)
+        if endOptPrice.shape[-1] != n + 1:
+            raise Exception("endOptPrice should hold the n + 1 terminal nodes", endOptPrice.shape[-1], n)
+        prob = terminal_probabilities(self.pr, n)
+        stk_return = terminal_prices(1.0, self.up, self.dn, n)
+        opt_return = endOptPrice / np.asarray(opt0, dtype=np.float64)[..., None]
+
+        stk_dev = stk_return - prob @ stk_return
+        opt_dev = opt_return - (opt_return @ prob)[..., None]
+        cov = (opt_dev * stk_dev) @ prob
+        var_stk_return = (stk_dev * stk_dev) @ prob
         beta = cov / var_stk_return
 
-        return beta
+        return float(beta) if beta.ndim == 0 else beta
 
     def liquidPrice(self, s0, k1, k2, t1, t2, div):
-        self.Tree(s0=s0, func=lambda x: BSPricer(k2, self.rf, div, self.vol, t2 - t1, 1))
-        return self.expectedResult(func=BinomialTree.optionExercise(self, k1))
-
-    def getLiquidPrice(self, k1, k2, t1, t2, div, marketCap):
-        return root(lambda x: self.liquidPrice(x, k1, k2, t1, t2, div) - marketCap, np.array([20])).x[0]
-
-    def illquidPrice(self, a0, k, ttm, rf, sharpR, sigma):
+        # Expected value at t1 of max(C(V) - k1, 0), C being the call on the firm struck at k2 and expiring at t2,
+        # over the terminal nodes of the tree. The call is priced at every node in one vectorized BSPricer call, and
+        # s0 may be an array of candidate asset values (one row of nodes each)
+        s0 = np.asarray(s0, dtype=np.float64)
+        nodes = terminal_prices(s0, self.up, self.dn, self.steps)
+        values = np.maximum(BSPricer(nodes, k2, self.rf, div, self.vol, t2 - t1, 1) - k1, 0)
+        result = values @ terminal_probabilities(self.pr, self.steps)
+        return float(result) if result.ndim == 0 else result
+
+    def getLiquidPrice(self, k1, k2, t1, t2, div, marketCap, gridSize=33):
+        # Asset value whose liquid price matches the market cap. The liquid price is increasing in s0: one vectorized
+        # pass over a grid of candidate s0 values brackets the match in a single grid cell, then brentq refines it
+        hi = marketCap + k1 + k2
+        while self.liquidPrice(hi, k1, k2, t1, t2, div) < marketCap:
+            hi *= 2
+        grid = np.linspace(hi / gridSize, hi, gridSize)
+        prices = self.liquidPrice(grid, k1, k2, t1, t2, div)
+        i = int(np.searchsorted(prices, marketCap))
+        lo = grid[i - 1] if i > 0 else hi * 1e-12
+        return brentq(lambda x: self.liquidPrice(x, k1, k2, t1, t2, div) - marketCap, lo, grid[i])
+
+    @staticmethod
+    def illquidPrice(a0, k, ttm, rf, sharpR, sigma):
         # This is a function of closed form of illiquidPrice in Pro. Chen's paper Valuing a Liquidity Discount
-        # inputs are:
+        # inputs are (every one may be an array, they broadcast against each other):
         # k is 1/2 long term debt + short term debt;
         # a0 is initial firm asset value
         # ttm is time to maturity
@@ -94,28 +115,31 @@ class Liquidity(BinomialTree):
         # sigma is volatility
 
         mu = rf + sharpR * sigma
-        dp = (math.log(a0 / k) + (mu + 0.5 * sigma * sigma) * ttm) / (sigma * math.sqrt(ttm))
-        dd = dp - sigma * math.sqrt(ttm)
-        dpp = dp + sigma * math.sqrt(ttm)
+        dp = (np.log(a0 / k) + (mu + 0.5 * sigma * sigma) * ttm) / (sigma * np.sqrt(ttm))
+        dd = dp - sigma * np.sqrt(ttm)
+        dpp = dp + sigma * np.sqrt(ttm)
 
-        EXT = a0 * math.exp(mu * ttm) * norm.cdf(dp) - k * norm.cdf(dd)
-        EVT = a0 * math.exp(mu * ttm)
-        EXTVT = math.pow(a0, 2) * math.exp((2 * mu + sigma * sigma) * ttm) * norm.cdf(dpp) - k * a0 * math.exp(
-            mu * ttm) * norm.cdf(dp)
+        EXT = a0 * np.exp(mu * ttm) * ndtr(dp) - k * ndtr(dd)
+        EVT = a0 * np.exp(mu * ttm)
+        EXTVT = np.square(a0) * np.exp((2 * mu + sigma * sigma) * ttm) * ndtr(dpp) - k * a0 * np.exp(
+            mu * ttm) * ndtr(dp)
 
         cov = EXTVT - EXT * EVT
-        var = math.pow(a0, 2) * math.exp(2 * mu * ttm) * (math.exp(sigma * sigma * ttm) - 1)
+        var = np.square(a0) * np.exp(2 * mu * ttm) * np.expm1(sigma * sigma * ttm)
 
         beta = cov / var
 
-        result = math.exp(-rf * ttm) * (EXT - beta * (EVT - a0 * math.exp(rf * ttm)))
-
-        return result
+        result = np.exp(-rf * ttm) * (EXT - beta * (EVT - a0 * np.exp(rf * ttm)))
 
-    def calibrateWealth(self, adjustmentFactor, rf, div, vol, T, pcFlag, equityMarket):
-        return brentq(BSPricer_calibrate,
-                      0.01, 200 * equityMarket,
-                      args=(rf, div, vol, T, pcFlag, adjustmentFactor, equityMarket))
+        return float(result) if np.ndim(result) == 0 else result
 
-# return root(lambda w: Liquidity.BSPricer(w, w * adjustmentFactor, rf, div, vol, T, pcFlag) - equityMarket,
-#			[equityMarket]).x[0]
\ No newline at end of file
+    @staticmethod
+    def calibrateWealth(adjustmentFactor, rf, div, vol, T, pcFlag, equityMarket):
+        # Firm wealth W whose option struck at W * adjustmentFactor is worth the market equity. Black-Scholes is
+        # homogeneous of degree one in (spot, strike), so BSPricer_calibrate is linear in W and the root is the market
+        # equity over the option on one unit of wealth: no root search, and a whole cross-section of arrays at once.
+        # Returns nan where the unit option is worthless (no wealth matches the equity)
+        unit = BSPricer(1.0, adjustmentFactor, rf, div, vol, T, pcFlag)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = np.where(unit > 0, equityMarket / unit, np.nan)
+        return float(result) if result.ndim == 0 else result
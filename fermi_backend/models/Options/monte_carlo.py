@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked Monte Carlo pricer for path-dependent options on a GBM underlying.
+
+Paths are simulated in fixed-size chunks so memory stays at chunk_size x n_steps
+whatever the total path count. Each chunk only returns the running sums needed
+for the estimator (counts, first and second moments of the payoff and of the
+control), so chunks can be spread over a process pool and merged exactly.
+Chunk i always draws from the i-th child of the seed (or the i-th block of the
+Sobol sequence), so results don't depend on the number of processes.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.stats import norm, qmc
+
+PAYOFFS = ('european', 'asian', 'barrier', 'lookback')
+BARRIER_TYPES = ('up-and-out', 'down-and-out', 'up-and-in', 'down-and-in')
+
+
+def _bs_price(s, k, rf, div, vol, T, pcFlag):
+    d1 = (np.log(s / k) + (rf - div + vol * vol / 2) * T) / (vol * np.sqrt(T))
+    d2 = d1 - vol * np.sqrt(T)
+    return pcFlag * (s * np.exp(-div * T) * norm.cdf(pcFlag * d1) - k * np.exp(-rf * T) * norm.cdf(pcFlag * d2))
+
+
+def _normals(chunk_index, start, size, n_steps, seed, sobol):
+    if sobol:
+        engine = qmc.Sobol(d=n_steps, scramble=True, seed=seed)
+        if start:
+            engine.fast_forward(start)
+        # Keep the open interval so the inverse cdf stays finite
+        return norm.ppf(np.clip(engine.random(size), 1e-12, 1 - 1e-12))
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+    return rng.standard_normal((size, n_steps))
+
+
+def _payoff(paths, k, pcFlag, payoff, barrier, barrier_type):
+    terminal = paths[:, -1]
+    if payoff == 'european':
+        return np.maximum(pcFlag * (terminal - k), 0)
+    if payoff == 'asian':
+        return np.maximum(pcFlag * (paths.mean(axis=1) - k), 0)
+    if payoff == 'lookback':
+        extreme = paths.max(axis=1) if pcFlag > 0 else paths.min(axis=1)
+        return np.maximum(pcFlag * (extreme - k), 0)
+    # Discretely monitored barrier at every simulated date
+    if barrier_type.startswith('up'):
+        crossed = paths.max(axis=1) >= barrier
+    else:
+        crossed = paths.min(axis=1) <= barrier
+    alive = ~crossed if barrier_type.endswith('out') else crossed
+    return np.where(alive, np.maximum(pcFlag * (terminal - k), 0), 0)
+
+
+def _simulate_chunk(spec):
+    # Running sums for one chunk: n, sum(y), sum(x), sum(y^2), sum(x^2), sum(x*y)
+    (chunk_index, start, size, s, k, rf, div, vol, T, pcFlag, payoff, barrier, barrier_type, n_steps, antithetic,
+     seed, sobol) = spec
+    dt = T / n_steps
+    z = _normals(chunk_index, start, size, n_steps, seed, sobol)
+    if antithetic:
+        z = np.concatenate([z, -z])
+
+    np.multiply(z, vol * np.sqrt(dt), out=z)
+    z += (rf - div - vol * vol / 2) * dt
+    np.cumsum(z, axis=1, out=z)
+    paths = np.exp(z, out=z)
+    paths *= s
+
+    disc = np.exp(-rf * T)
+    y = disc * _payoff(paths, k, pcFlag, payoff, barrier, barrier_type)
+    # Control: the European option for path-dependent payoffs, the discounted terminal price for the European itself
+    if payoff == 'european':
+        x = disc * paths[:, -1]
+    else:
+        x = disc * np.maximum(pcFlag * (paths[:, -1] - k), 0)
+    if antithetic:
+        # Each antithetic pair is one independent sample
+        half = len(y) // 2
+        y = (y[:half] + y[half:]) / 2
+        x = (x[:half] + x[half:]) / 2
+    return np.array([len(y), y.sum(), x.sum(), y @ y, x @ x, x @ y])
+
+
+def monte_carlo_price(s, k, rf, div, vol, T, pcFlag, payoff='european', n_paths=100000, n_steps=1,
+                      barrier=None, barrier_type='down-and-out', antithetic=True, control_variate=True, sobol=False,
+                      seed=None, chunk_size=2 ** 14, processes=None):
+    """
+    Monte Carlo price of a (possibly path-dependent) option under GBM
+
+    :param s: spot price
+    :param k: strike price
+    :param rf: risk-free rate
+    :param div: continuous dividend yield
+    :param vol: volatility of the underlying asset
+    :param T: time to maturity (in years)
+    :param pcFlag: 1 for call -1 for put
+    :param payoff: 'european', 'asian' (arithmetic average of the monitoring dates), 'barrier' or 'lookback'
+                   (fixed strike on the path maximum for calls, minimum for puts)
+    :param n_paths: total number of simulated paths
+    :param n_steps: monitoring dates per path
+    :param barrier: barrier level, required for 'barrier'
+    :param barrier_type: 'up-and-out', 'down-and-out', 'up-and-in' or 'down-and-in'
+    :param antithetic: pair every draw with its negative
+    :param control_variate: regress on a control with known mean (the Black-Scholes price of the European option,
+                            or the forward for a European payoff)
+    :param sobol: use scrambled Sobol draws instead of pseudo-random ones; the standard error then treats the
+                  points as independent, which overstates it
+    :param seed: seed for reproducibility
+    :param chunk_size: paths simulated at once, bounds memory at chunk_size * n_steps floats; keep it a power of 2
+                       with sobol so every block of the sequence stays balanced
+    :param processes: spread chunks over this many worker processes, None or 1 runs in-process
+    :return: (price, standard error)
+    """
+    if payoff not in PAYOFFS:
+        raise Exception("Invalid payoff", payoff)
+    if payoff == 'barrier' and (barrier is None or barrier_type not in BARRIER_TYPES):
+        raise Exception("Invalid barrier", barrier, barrier_type)
+    if n_paths < 4 or n_steps < 1 or chunk_size < 2:
+        raise Exception("Invalid simulation size", n_paths, n_steps, chunk_size)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    n_steps = 1 if payoff == 'european' else int(n_steps)
+    # Independent draws per chunk, halved when each one is mirrored
+    draws, block = (int(n_paths) // 2, int(chunk_size) // 2) if antithetic else (int(n_paths), int(chunk_size))
+    starts = range(0, draws, block)
+    specs = [(i, start, min(block, draws - start), s, k, rf, div, vol, T, pcFlag, payoff, barrier, barrier_type,
+              n_steps, antithetic, seed, sobol) for i, start in enumerate(starts)]
+    if processes is not None and processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            totals = sum(pool.map(_simulate_chunk, specs))
+    else:
+        totals = sum(map(_simulate_chunk, specs))
+
+    n, sum_y, sum_x, sum_yy, sum_xx, sum_xy = totals
+    mean_y, mean_x = sum_y / n, sum_x / n
+    var_y = (sum_yy - n * mean_y * mean_y) / (n - 1)
+    if not control_variate:
+        return float(mean_y), float(np.sqrt(var_y / n))
+
+    var_x = (sum_xx - n * mean_x * mean_x) / (n - 1)
+    cov_xy = (sum_xy - n * mean_x * mean_y) / (n - 1)
+    if payoff == 'european':
+        control_mean = s * np.exp(-div * T)
+    else:
+        control_mean = _bs_price(s, k, rf, div, vol, T, pcFlag)
+    beta = cov_xy / var_x if var_x > 0 else 0.0
+    price = mean_y - beta * (mean_x - control_mean)
+    residual_var = max(var_y - beta * cov_xy, 0.0)
+    return float(price), float(np.sqrt(residual_var / n))
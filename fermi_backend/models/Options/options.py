@@ -4,6 +4,8 @@ import math
 from scipy.stats import norm
 from scipy.optimize import root
 from scipy.optimize import brentq
+from fermi_backend.models.Binomial.lattice import lattice_price, lattice_greeks, lattice_estimate
+from fermi_backend.models.Options.monte_carlo import monte_carlo_price
 
 
 class Options:
@@ -26,12 +28,29 @@ class Options:
         self.T = T
         self.pcFlag = pcFlag
 
+    @classmethod
+    def batch(cls, s, k, rf, div, vol, T, pcFlag):
+        """
+        Build an option chain. Every input may be a scalar or an array; they are broadcast against each other
+        into float64 arrays, so bs() and binomial_tree() price every contract in one vectorized call
+
+        :param s: spot price(s)
+        :param k: strike price(s)
+        :param rf: risk-free rate(s)
+        :param div:
+        :param vol: volatility(ies) of the underlying asset
+        :param T: time(s) to maturity
+        :param pcFlag: 1 for call -1 for put, per contract
+        :return: Options whose attributes are arrays of the broadcast shape
+        """
+        return cls(*np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (s, k, rf, div, vol, T, pcFlag))))
+
     def d1(self):
-        return (math.log(self.s / self.k) + (self.rf - self.div + self.vol * self.vol / 2) * self.T) \
-               / (self.vol * math.sqrt(self.T))
+        return (np.log(self.s / self.k) + (self.rf - self.div + self.vol * self.vol / 2) * self.T) \
+               / (self.vol * np.sqrt(self.T))
 
     def d2(self):
-        return self.d1() - self.vol * math.sqrt(self.T)
+        return self.d1() - self.vol * np.sqrt(self.T)
 
     def bs(self):
         """
@@ -46,43 +65,148 @@ class Options:
         :return:
         """
 
-        d1, d2 = self.d1(), self.d2()
+        d1 = self.d1()
+        d2 = d1 - self.vol * np.sqrt(self.T)
 
         n1 = norm.cdf(d1 * self.pcFlag, 0, 1)
         n2 = norm.cdf(d2 * self.pcFlag, 0, 1)
-        result = self.s * math.exp(-self.div * self.T) * self.pcFlag * n1 - \
-                 self.k * math.exp(-self.rf * self.T) * self.pcFlag * n2
+        result = self.s * np.exp(-self.div * self.T) * self.pcFlag * n1 - \
+                 self.k * np.exp(-self.rf * self.T) * self.pcFlag * n2
         return result
 
-    def binomial_tree(self, N):
+    def binomial_tree(self, N, american=False, dividends=None, scheme='crr'):
+        """
 
-        # upward factor
-        u = np.exp(self.vol * np.sqrt(self.T / N))
-        # downward factor
-        d = np.exp(-self.vol * np.sqrt(self.T / N))
-        # prob for price rise
-        pu = ((np.exp(self.rf * self.T / N)) - d) / (u - d)
-        # prob for price down
-        pd = 1 - pu
-        # discount rate
-        disc = np.exp(-self.rf * self.T / N)
+        :param N: number of steps for binomial tree
+        :param american: allow early exercise
+        :param dividends: optional discrete cash dividends as (payment time in years, amount) pairs, paid on top of
+                          the continuous yield div
+        :param scheme: 'crr' (Cox-Ross-Rubinstein), 'lr' (Leisen-Reimer) or 'trinomial'
+        :return: option price on the lattice, an array of prices for a batch
+        """
+        return lattice_price(self.s, self.k, self.T, self.rf, self.vol, N, self.pcFlag, self.div, american, dividends,
+                             scheme)
 
-        St = [0] * (N + 1)
-        C = [0] * (N + 1)
+    def tree_estimate(self, N, american=False, dividends=None, scheme='crr', richardson=False):
+        """
 
-        St[0] = self.s * d ** N
+        :param N: number of steps for the lattice
+        :param american: allow early exercise
+        :param dividends: optional discrete cash dividends as (payment time in years, amount) pairs
+        :param scheme: 'crr' (Cox-Ross-Rubinstein), 'lr' (Leisen-Reimer) or 'trinomial'
+        :param richardson: extrapolate the N and 2N step prices
+        :return: (price, error estimate), see lattice_estimate; the error is None for 'crr' and 'trinomial'
+        """
+        return lattice_estimate(self.s, self.k, self.T, self.rf, self.vol, N, self.pcFlag, self.div, american,
+                                dividends, scheme, richardson)
 
-        for j in range(1, N + 1):
-            St[j] = St[j - 1] * u / d
+    def monte_carlo(self, payoff='european', n_paths=100000, n_steps=1, barrier=None, barrier_type='down-and-out',
+                    antithetic=True, control_variate=True, sobol=False, seed=None, chunk_size=2 ** 14,
+                    processes=None):
+        """
 
-        for j in range(1, N + 1):
-            if self.pcFlag == -1:
-                C[j] = max(self.k - St[j], 0)
-            else:
-                C[j] = max(St[j] - self.k, 0)
-        for i in range(N, 0, -1):
-            for j in range(0, i):
-                C[j] = disc * (pu * C[j + 1] + pd * C[j])
+        :param payoff: 'european', 'asian', 'barrier' or 'lookback'
+        :param n_paths: total number of simulated paths
+        :param n_steps: monitoring dates per path
+        :param barrier: barrier level, required for 'barrier'
+        :param barrier_type: 'up-and-out', 'down-and-out', 'up-and-in' or 'down-and-in'
+        :param antithetic: use antithetic variates
+        :param control_variate: use the Black-Scholes price as a control variate
+        :param sobol: use scrambled Sobol draws
+        :param seed: seed for reproducibility
+        :param chunk_size: paths simulated at once
+        :param processes: number of worker processes, None runs in-process
+        :return: (price, standard error), see monte_carlo_price
+        """
+        return monte_carlo_price(self.s, self.k, self.rf, self.div, self.vol, self.T, self.pcFlag, payoff, n_paths,
+                                 n_steps, barrier, barrier_type, antithetic, control_variate, sobol, seed, chunk_size,
+                                 processes)
+
+    def greeks(self):
+        """
+        Closed-form Black-Scholes Greeks. d1/d2, the normal pdf and both cdfs are evaluated once and shared,
+        and every input may be an array (see batch)
 
-        return C[0]
+        :return: dict of 'price', 'delta', 'gamma', 'vega' (per 1.00 of vol), 'theta' (per year) and
+                 'rho' (per 1.00 of rate)
+        """
+        sqrt_t = np.sqrt(self.T)
+        d1 = self.d1()
+        d2 = d1 - self.vol * sqrt_t
+        pdf1 = norm.pdf(d1)
+        n1 = norm.cdf(d1 * self.pcFlag)
+        n2 = norm.cdf(d2 * self.pcFlag)
+        div_disc = np.exp(-self.div * self.T)
+        rf_disc = np.exp(-self.rf * self.T)
+
+        spot_leg = self.s * div_disc * self.pcFlag * n1
+        strike_leg = self.k * rf_disc * self.pcFlag * n2
+        return {
+            'price': spot_leg - strike_leg,
+            'delta': div_disc * self.pcFlag * n1,
+            'gamma': div_disc * pdf1 / (self.s * self.vol * sqrt_t),
+            'vega': self.s * div_disc * pdf1 * sqrt_t,
+            'theta': -self.s * div_disc * pdf1 * self.vol / (2 * sqrt_t) + self.div * spot_leg - self.rf * strike_leg,
+            'rho': self.T * strike_leg,
+        }
+
+    def binomial_greeks(self, N, american=False, dividends=None, scheme='crr'):
+        """
 
+        :param N: number of steps for binomial tree, at least 2
+        :param american: allow early exercise
+        :param dividends: optional discrete cash dividends as (payment time in years, amount) pairs
+        :param scheme: 'crr' or 'lr'
+        :return: dict of 'price', 'delta', 'gamma' and 'theta' (per year) read off the first levels of the tree
+        """
+        return lattice_greeks(self.s, self.k, self.T, self.rf, self.vol, N, self.pcFlag, self.div, american,
+                              dividends, scheme)
+
+    def implied_vol(self, price, tol=1e-8, maxiter=100):
+        """
+        Implied volatility for every contract at once: a Corrado-Miller rational first guess, then Newton steps on
+        vega, falling back to bisection whenever a step leaves the current bracket. self.vol is ignored, and prices
+        outside the no-arbitrage bounds give nan
+
+        :param price: observed option price(s), broadcast against the contract inputs
+        :param tol: absolute price tolerance
+        :param maxiter: maximum number of Newton/bisection iterations
+        :return: implied volatility, float for scalar inputs or ndarray of the broadcast shape
+        """
+        inputs = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64)
+                                       for x in (price, self.s, self.k, self.rf, self.div, self.T, self.pcFlag)))
+        shape = inputs[0].shape
+        price, s, k, rf, div, T, pcFlag = (x.ravel() for x in inputs)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            spot_pv = s * np.exp(-div * T)
+            strike_pv = k * np.exp(-rf * T)
+            # Solve on call prices throughout; puts map over by put-call parity and share the same vega
+            call_price = np.where(pcFlag < 0, price + spot_pv - strike_pv, price)
+            valid = (T > 0) & (call_price > np.maximum(spot_pv - strike_pv, 0)) & (call_price < spot_pv)
+
+            half_itm = (spot_pv - strike_pv) / 2
+            excess = call_price - half_itm
+            vol = np.sqrt(2 * np.pi) / (spot_pv + strike_pv) \
+                  * (excess + np.sqrt(np.maximum(excess ** 2 - 4 * half_itm ** 2 / np.pi, 0))) / np.sqrt(T)
+            lo = np.full(vol.shape, 1e-6)
+            hi = np.full(vol.shape, 10.0)
+            vol = np.where(np.isfinite(vol) & (vol > lo) & (vol < hi), vol, 0.3)
+
+            active = np.flatnonzero(valid)
+            for _ in range(maxiter):
+                if active.size == 0:
+                    break
+                greeks = Options(s[active], k[active], rf[active], div[active], vol[active], T[active], 1).greeks()
+                diff = greeks['price'] - call_price[active]
+                hi[active] = np.where(diff > 0, vol[active], hi[active])
+                lo[active] = np.where(diff > 0, lo[active], vol[active])
+                step = vol[active] - diff / greeks['vega']
+                bisect = ~np.isfinite(step) | (step <= lo[active]) | (step >= hi[active])
+                converged = np.abs(diff) < tol
+                vol[active] = np.where(converged, vol[active],
+                                       np.where(bisect, (lo[active] + hi[active]) / 2, step))
+                active = active[~converged]
+
+        vol[~valid] = np.nan
+        return float(vol[0]) if not shape else vol.reshape(shape)
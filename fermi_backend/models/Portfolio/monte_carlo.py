@@ -0,0 +1,156 @@
+"""
+Chunked multivariate Monte Carlo VaR for a portfolio of assets.
+
+Asset log returns are drawn jointly, through the Cholesky factor of their covariance or a PCA factor model with
+idiosyncratic noise, with normal or Student-t innovations, or by resampling whole historical days. They are summed over
+the horizon and the portfolio loses w . (exp(R) - 1), so the result keeps the cross-asset structure and the
+compounding that a univariate normal draw of the portfolio return misses.
+
+Scenarios are simulated in fixed-size chunks. Chunk i always draws from the i-th child of the seed, so results don't
+depend on the number of processes. Only the worst returns can hold the VaR and the ES: each chunk hands back its
+lowest K, K being the largest rank asked for, and the parent keeps a running lowest K. Memory stays at
+chunk_size * horizon * assets draws plus K floats, and the estimates are exactly those of the full sample.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+METHODS = ('cholesky', 'factor')
+INNOVATIONS = ('normal', 't', 'bootstrap')
+
+# Set once per worker (or in-process) so chunks don't ship the covariance factor with every task
+_model = None
+
+
+def _set_model(model):
+    global _model
+    _model = model
+
+
+def _loading(cov, method, n_factors):
+    # Square root of the covariance (Cholesky, or the symmetric one when it isn't positive definite), or the leading
+    # eigenvectors with the residual variance left as independent noise
+    if method == 'cholesky':
+        try:
+            return np.linalg.cholesky(cov), None
+        except np.linalg.LinAlgError:
+            n_factors = len(cov)
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    order = np.argsort(eigenvalues)[::-1][:n_factors]
+    loading = eigenvectors[:, order] * np.sqrt(np.maximum(eigenvalues[order], 0))
+    residual = np.sqrt(np.maximum(np.diag(cov) - np.einsum('ij,ij->i', loading, loading), 0))
+    return loading, (residual if method == 'factor' else None)
+
+
+def _simulate_chunk(spec):
+    # Lowest `keep` portfolio returns of one chunk of scenarios
+    chunk_index, size, keep, seed = spec
+    mean, loading, residual, history, weights, innovations, dof, horizon = _model
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+    if innovations == 'bootstrap':
+        # Whole days keep the cross-section of the historical returns
+        returns = np.zeros((size, history.shape[1]))
+        for _ in range(horizon):
+            returns += history[rng.integers(len(history), size=size)]
+    elif innovations == 'normal':
+        # A sum of normal days is one normal draw with the horizon's mean and covariance
+        returns = horizon * mean + np.sqrt(horizon) * (rng.standard_normal((size, loading.shape[1])) @ loading.T)
+        if residual is not None:
+            returns += np.sqrt(horizon) * rng.standard_normal((size, len(residual))) * residual
+    else:
+        # Multivariate t with the covariance of the data: one chi-square per day scales every asset
+        returns = np.full((size, len(mean)), horizon * mean)
+        for _ in range(horizon):
+            scale = np.sqrt((dof - 2) / rng.chisquare(dof, size=(size, 1)))
+            day = rng.standard_normal((size, loading.shape[1])) @ loading.T
+            if residual is not None:
+                day += rng.standard_normal((size, len(residual))) * residual
+            returns += scale * day
+    portfolio = np.expm1(returns) @ weights
+    if size > keep:
+        portfolio = np.partition(portfolio, keep - 1)[:keep]
+    return portfolio
+
+
+def _lowest(chunks, keep):
+    # Running lowest `keep` values, merged whenever the pending chunks hold as many again: memory stays under 2 * keep
+    worst, pending, pending_size = np.empty(0), [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= keep:
+            worst = np.partition(np.concatenate([worst] + pending), keep - 1)[:keep]
+            pending, pending_size = [], 0
+    worst = np.concatenate([worst] + pending)
+    return np.partition(worst, min(keep, len(worst)) - 1)[:keep]
+
+
+def monte_carlo_var(returns, weights, level=5, n_scenarios=100000, horizon=1, method='cholesky', innovations='normal',
+                    dof=5, n_factors=None, es=False, seed=None, chunk_size=2 ** 14, processes=None):
+    """
+    Monte Carlo VaR (and expected shortfall) of a portfolio from a joint simulation of its assets
+
+    :param returns: daily log returns, one row per day and one column per asset (DataFrame or 2-d array)
+    :param weights: portfolio weights
+    :param level: tail percentage (e.g. 5), or a list of them
+    :param n_scenarios: total number of simulated scenarios
+    :param horizon: holding period in days, the daily returns are summed over it
+    :param method: 'cholesky' (falls back to the eigen square root if the covariance is singular) or 'factor' (the
+                   n_factors leading principal components, the rest of each asset's variance as independent noise)
+    :param innovations: 'normal', 't' (multivariate Student-t with dof degrees of freedom, same covariance) or
+                        'bootstrap' (resample whole historical days, method is then unused)
+    :param dof: degrees of freedom of the t innovations, above 2
+    :param n_factors: number of factors for 'factor', defaults to a fifth of the assets
+    :param es: also return the expected shortfall, the average return at or below the VaR quantile
+    :param seed: seed for reproducibility
+    :param chunk_size: scenarios simulated at once, bounds memory at chunk_size * horizon * assets draws
+    :param processes: spread chunks over this many worker processes, None or 1 runs in-process
+    :return: VaR, or (VaR, ES), as positive fractions of the portfolio value, arrays if level is a list
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    if returns.ndim != 2 or returns.shape[1] != len(weights):
+        raise Exception("Returns should be a 2 dimensions matrix with one column per weight", returns.shape)
+    if method not in METHODS or innovations not in INNOVATIONS:
+        raise Exception("Invalid method or innovations", method, innovations)
+    if innovations == 't' and dof <= 2:
+        raise Exception("Invalid degrees of freedom, should be above 2", dof)
+    if n_scenarios < 2 or horizon < 1 or chunk_size < 1:
+        raise Exception("Invalid simulation size", n_scenarios, horizon, chunk_size)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    tail = np.asarray(level, dtype=np.float64) / 100
+    # Nearest rank in the full sample, as np.percentile(method='nearest')
+    ranks = np.around(tail * (n_scenarios - 1)).astype(int)
+    keep = int(np.max(ranks)) + 1
+
+    mean = returns.mean(axis=0)
+    if innovations == 'bootstrap':
+        loading = residual = None
+    else:
+        cov = np.atleast_2d(np.cov(returns.T))
+        n_factors = max(len(weights) // 5, 1) if n_factors is None else min(n_factors, len(weights))
+        loading, residual = _loading(cov, method, n_factors)
+    model = (mean, loading, residual, returns, weights, innovations, dof, int(horizon))
+
+    specs = [(i, min(chunk_size, n_scenarios - start), keep, seed)
+             for i, start in enumerate(range(0, n_scenarios, chunk_size))]
+    if processes is not None and processes > 1:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_set_model, initargs=(model,)) as pool:
+            worst = _lowest(pool.map(_simulate_chunk, specs), keep)
+    else:
+        _set_model(model)
+        try:
+            worst = _lowest(map(_simulate_chunk, specs), keep)
+        finally:
+            _set_model(None)
+
+    worst = np.sort(worst)
+    var = np.abs(worst[ranks])
+    if not es:
+        return var if var.ndim else float(var)
+    shortfall = np.abs(np.cumsum(worst)[ranks] / (ranks + 1))
+    return (var, shortfall) if var.ndim else (float(var), float(shortfall))
+
@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 from typing import List, Tuple, Optional, Union
 from fermi_backend.models.utils import *
+from fermi_backend.models.Portfolio.monte_carlo import monte_carlo_var as simulate_var
 from scipy.stats import norm
 import random
 import scipy.optimize as solver
@@ -50,21 +51,43 @@ class Portfolio:
 
         return sharpe_ratio
 
-    def pvar(self, ci=0.95, alpha=0):
+    def pvar(self, ci=0.95, alpha=0, es=False):
+        """
+        Parametric VaR of the exponentially weighted portfolio returns
+
+        :param ci: confidence level, or its tail probability (0.95 and 0.05 give the same VaR), or a list of them
+        :param alpha: decay of the weights, 0 weights every day equally
+        :param es: also return the expected shortfall, normal closed form from the same variance
+        :return: VaR, or (VaR, ES), arrays if ci is a list
+        """
         ew = (1 - alpha) ** np.arange(len(self.log_return))[::-1]
         ew_return = ew * self.portfolio_return
-        return abs(norm.ppf(ci) * np.sqrt(ew_return.var()))
+        tail = np.minimum(np.asarray(ci, dtype=np.float64), 1 - np.asarray(ci, dtype=np.float64))
+        return normal_tail_risk(np.sqrt(ew_return.var()), tail, es)
 
     # pass
-    def hvar(self, level=5):
-        return abs(np.percentile(self.portfolio_return, float(level), interpolation="nearest"))
+    def hvar(self, level=5, es=False):
+        """
+        Historical VaR, and expected shortfall from the same sorted returns
+
+        :param level: tail percentage (e.g. 5), or a list of them
+        :param es: also return the expected shortfall
+        :return: VaR, or (VaR, ES), arrays if level is a list
+        """
+        return tail_risk(self.portfolio_return.values, np.asarray(level, dtype=np.float64) / 100, es)
 
     # pass
-    def monte_carlo_var(self, level=5, n=10000):
-        port_return_mean = self.portfolio_return.mean()
-        port_return_std = self.portfolio_return.std()
-        mc_return = np.random.normal(loc=port_return_mean, scale=port_return_std, size=n)
-        return abs(np.percentile(mc_return, level, interpolation="nearest"))
+    def monte_carlo_var(self, level=5, n=10000, es=False, **kwargs):
+        """
+        Monte Carlo VaR from a joint simulation of the assets (see models.Portfolio.monte_carlo.monte_carlo_var)
+
+        :param level: tail percentage (e.g. 5), or a list of them
+        :param n: number of simulated scenarios
+        :param es: also return the expected shortfall from the same simulated sample
+        :param kwargs: horizon, method, innovations, dof, n_factors, seed, chunk_size, processes
+        :return: VaR, or (VaR, ES), arrays if level is a list
+        """
+        return simulate_var(self.log_return.values, self.weights, level, n, es=es, **kwargs)
 
     # calculate max-drawdown
     def mdd(self, window=252):
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Rolling VaR backtest: daily parametric or historical VaR over every window of the price history, compared with the
+next day's portfolio return, with Kupiec's proportion of failures and Christoffersen's independence tests.
+"""
+from .VaR import ValueAtRisk
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.special import xlogy
+from scipy.stats import chi2, norm
+
+
+class VaRBacktest(ValueAtRisk):
+	def __init__(self, interval, matrix, weights, window=252, chunkSize=4096):
+		# Initialize the parameters
+		# ----Input-----
+		# interval: significant interval in statistic, range from 0 to 1, or a list of them
+		# matrix: stock price matrix, each row represents one day price for different tickers, two dimensions ndarray
+		# weight: the weight for portfolio, one dimension array
+		# window: look back period of every VaR estimate
+		# chunkSize: windows sorted at once by rollingHistorical, bounds memory at chunkSize * window floats
+		# ----output----
+		ValueAtRisk.__init__(self, interval, matrix, weights)
+		self.portfolioReturn = np.dot(self.returnMatrix, self.weights)
+		if not 1 < window < len(self.portfolioReturn):
+			raise Exception("invalid Window, should be between 2 and", len(self.portfolioReturn) - 1)
+		self.window = window
+		self.chunkSize = chunkSize
+
+	def rollingParametric(self):
+		# Daily parametric VaR for every day after the first window, from the returns of the window before it. With
+		# fixed weights w' Cov w is the sample variance of the portfolio return, so every window comes from running sums
+		# ----output----
+		# percentage VaR, one row per tested day (one column per confidence level if ci is a list)
+		w = self.window
+		demeaned = self.portfolioReturn[:-1] - self.portfolioReturn[:-1].mean()
+		sums = np.concatenate([[0], np.cumsum(demeaned)])
+		squares = np.concatenate([[0], np.cumsum(demeaned * demeaned)])
+		s1, s2 = sums[w:] - sums[:-w], squares[w:] - squares[:-w]
+		variance = np.maximum(s2 - s1 * s1 / w, 0) / (w - 1)
+		return np.abs(np.multiply.outer(np.sqrt(variance), norm.ppf(self.ci)))
+
+	def rollingHistorical(self):
+		# Daily historical VaR for every day after the first window, the same order statistic as HistoricalVaR.var
+		# (nearest rank) on the window before it. Windows are partitioned in chunks, every level in the same pass
+		# ----output----
+		# percentage VaR, one row per tested day (one column per confidence level if ci is a list)
+		w = self.window
+		ranks = np.percentile(np.arange(w), 100 * (1 - np.asarray(self.ci)), method='nearest').astype(int)
+		windows = sliding_window_view(self.portfolioReturn[:-1], w)
+		result = np.empty((len(windows),) + np.shape(ranks))
+		for start in range(0, len(windows), self.chunkSize):
+			chunk = np.partition(windows[start:start + self.chunkSize], np.unique(ranks), axis=1)
+			result[start:start + self.chunkSize] = chunk[:, ranks]
+		return np.abs(result)
+
+	def exceedances(self, varSeries):
+		# Days whose loss exceeds the VaR estimated the day before
+		# ----Input-----
+		# varSeries: output of rollingParametric or rollingHistorical
+		# ----output----
+		# boolean array shaped like varSeries
+		realized = self.portfolioReturn[self.window:]
+		return realized.reshape((-1,) + (1,) * (np.ndim(varSeries) - 1)) < -varSeries
+
+	@staticmethod
+	def kupiec(exceed, interval):
+		# Kupiec proportion of failures test: is the exceedance rate 1 - interval
+		# ----Input-----
+		# exceed: boolean exceedance series
+		# interval: confidence level of the VaR
+		# ----output----
+		# likelihood ratio and its p-value (chi-square, 1 degree of freedom)
+		n, x = len(exceed), int(np.sum(exceed))
+		p, rate = 1 - interval, x / n
+		logNull = xlogy(n - x, 1 - p) + xlogy(x, p)
+		logAlt = xlogy(n - x, 1 - rate) + xlogy(x, rate)
+		lr = max(-2 * (logNull - logAlt), 0.0)
+		return lr, chi2.sf(lr, 1)
+
+	@staticmethod
+	def christoffersen(exceed):
+		# Christoffersen independence test: is an exceedance as likely the day after an exceedance as after a quiet day
+		# ----Input-----
+		# exceed: boolean exceedance series
+		# ----output----
+		# likelihood ratio and its p-value (chi-square, 1 degree of freedom)
+		previous, current = np.asarray(exceed[:-1]), np.asarray(exceed[1:])
+		n00 = np.sum(~previous & ~current)
+		n01 = np.sum(~previous & current)
+		n10 = np.sum(previous & ~current)
+		n11 = np.sum(previous & current)
+		pi01 = n01 / max(n00 + n01, 1)
+		pi11 = n11 / max(n10 + n11, 1)
+		pi = (n01 + n11) / max(n00 + n01 + n10 + n11, 1)
+		logNull = xlogy(n00 + n10, 1 - pi) + xlogy(n01 + n11, pi)
+		logAlt = xlogy(n00, 1 - pi01) + xlogy(n01, pi01) + xlogy(n10, 1 - pi11) + xlogy(n11, pi11)
+		lr = max(-2 * (logNull - logAlt), 0.0)
+		return lr, chi2.sf(lr, 1)
+
+	def backtest(self, method='historical'):
+		# Rolling VaR backtest
+		# ----Input-----
+		# method: 'historical' or 'parametric'
+		# ----output----
+		# DataFrame with one row per confidence level: exceedance counts, Kupiec, Christoffersen and conditional
+		# coverage (both together, 2 degrees of freedom) statistics and p-values
+		if method == 'historical':
+			varSeries = self.rollingHistorical()
+		elif method == 'parametric':
+			varSeries = self.rollingParametric()
+		else:
+			raise Exception("Invalid method, only allowed historical or parametric, not", method)
+		exceed = self.exceedances(varSeries).reshape(len(varSeries), -1)
+		rows = []
+		for i, interval in enumerate(np.atleast_1d(self.ci)):
+			pofLR, pofP = VaRBacktest.kupiec(exceed[:, i], interval)
+			indLR, indP = VaRBacktest.christoffersen(exceed[:, i])
+			rows.append({'Confidence': interval, 'Observations': len(exceed), 'Exceedances': int(exceed[:, i].sum()),
+						 'Expected': len(exceed) * (1 - interval), 'Kupiec LR': pofLR, 'Kupiec p-value': pofP,
+						 'Christoffersen LR': indLR, 'Christoffersen p-value': indP,
+						 'Conditional Coverage LR': pofLR + indLR,
+						 'Conditional Coverage p-value': chi2.sf(pofLR + indLR, 2)})
+		return pd.DataFrame(rows).set_index('Confidence')
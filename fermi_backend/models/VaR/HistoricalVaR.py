@@ -5,28 +5,28 @@ Created on Wed Jul 25 23:35:03 2018
 @author: William Huang
 """
 from .VaR import ValueAtRisk
+from ..utils import tail_risk
 import numpy as np
 
 
 class HistoricalVaR(ValueAtRisk):
-	def var(self, marketValue=0, window=0):
+	def var(self, marketValue=0, window=0, es=False):
 		# return historical VaR
 		# ----Input-----
 		# marketValue: the market value of portfolio, if the value less or equal zero, function will return percentage
 		# window: look back period, if window is zero, it will use whole input price series
+		# es: also return the expected shortfall, the average return beyond the VaR from the same sorted returns
 		# ----output----
-		# Value at Risk in dollar or percentage if input market value is lee or equal zero
+		# Value at Risk in dollar or percentage if input market value is lee or equal zero, an array with one VaR per
+		# confidence level if ci is a list (the returns are sorted once for every level), (VaR, ES) if es is true
 		self.portfolioReturn = np.dot(self.returnMatrix, self.weights)
 		if (window > len(self.portfolioReturn) + 1):
 			raise Exception("invalid Window, cannot excess", len(self.portfolioReturn))
 
 		if (window > 0 and window < len(self.portfolioReturn)):
-			PercentageVaR = abs(
-				np.percentile(self.portfolioReturn[-window:], 100 * (1 - self.ci), interpolation='nearest'))
+			returns = self.portfolioReturn[-window:]
 		else:
-			PercentageVaR = abs(np.percentile(self.portfolioReturn, 100 * (1 - self.ci), interpolation='nearest'))
+			returns = self.portfolioReturn
 
-		if (marketValue <= 0):
-			return PercentageVaR
-		else:
-			return PercentageVaR * marketValue
+		return ValueAtRisk.scaleRisk(tail_risk(returns, 1 - np.asarray(self.ci), es),
+									  marketValue if marketValue > 0 else 1)
@@ -5,33 +5,59 @@ Created on Wed Jul 25 23:05:57 2018
 @author: William Huang
 """
 
-from models.VaR.VaR import ValueAtRisk
+from .VaR import ValueAtRisk
+from ..utils import normal_tail_risk
 import numpy as np
-from scipy.stats import norm
 from sklearn.decomposition import PCA
-from sklearn.linear_model import LinearRegression
 import pandas as pd
 import math
 
 
 class PCAVaR(ValueAtRisk):
-    def __init__(self, interval, matrix, universe, weights=np.ones(1)):
+    def __init__(self, interval, matrix, universe=None, weights=np.ones(1), factorModel=None):
         # Initialize the parameters
         # ----Input-----
         # interval: significant interval in statistic, range from 0 to 1
         # matrix: stock price matrix, each row represents one day price for different tickers, two dimensions ndarray
-        # universe: the stock universe to generate PCA components
+        # universe: the stock universe to generate PCA components, may be None when a fitted factorModel is given
         # weight: the weight for portfolio, one dimension array, default value is 1 which means there is only 1 stock in portfolio
+        # factorModel: components already fitted by fitFactorModel (e.g. the shared daily artifact), the price rows
+        #              of matrix should be the dates the factor returns were computed on
         # ----output----
+        ValueAtRisk.__init__(self, interval, matrix, weights)
+        if factorModel is not None:
+            if (len(matrix) != len(factorModel['factorMatrix']) + 1):
+                raise Exception('The length of input df and the length of the factor model should match')
+            self.setFactorModel(factorModel)
+            return
         if (len(matrix) != len(universe)):
             raise Exception('The length of input df and the length of universe df should match')
-        ValueAtRisk.__init__(self, interval, matrix, weights)
         if isinstance(universe, pd.DataFrame):
             # .fillna(method='ffill',axis=1)
             universe = universe.values
         self.universe = universe
         self.universeReturnMatrix = np.nan_to_num(np.diff(np.log(self.universe), axis=0))
 
+    @staticmethod
+    def fitFactorModel(universeReturnMatrix, n_components=2):
+        # Fit principle components on the universe returns
+        # ----Input-----
+        # universeReturnMatrix: universe log returns, each row represents one day
+        # n_components: the number of components user want to generate
+        # ----output----
+        # dict of the components, the factor returns and their covariance matrix
+        pca = PCA(n_components=n_components)
+        pca.fit(universeReturnMatrix)
+        factorMatrix = np.dot(universeReturnMatrix, pca.components_.T)
+        return {'components': pca.components_, 'factorMatrix': factorMatrix,
+                'factorCovVarMat': np.cov(factorMatrix.T)}
+
+    def setFactorModel(self, factorModel):
+        # Use fitted components, the arrays are shared and never written to
+        self.betaMatrix = factorModel['components']
+        self.factorMatrix = factorModel['factorMatrix']
+        self.factorCovVarMat = factorModel['factorCovVarMat']
+
     def getComponents(self, n_components=2):
         # Generate principle components
         # ----Input-----
@@ -40,45 +66,39 @@ class PCAVaR(ValueAtRisk):
         # factor matrix
         if self.universe.shape[1] < n_components:
             raise Exception("Too many PCA Components")
-        pca = PCA(n_components=n_components)
-        pca.fit(self.universeReturnMatrix)
-        self.betaMatrix = pca.components_
-        self.factorMatrix = np.dot(self.universeReturnMatrix, self.betaMatrix.T)
-        self.factorCovVarMat = np.cov(self.factorMatrix.T)
+        self.setFactorModel(PCAVaR.fitFactorModel(self.universeReturnMatrix, n_components))
         return self.factorMatrix
 
     def betaRegression(self, returns):
-        # Run linear regression on return series
+        # Run linear regression (with intercept) of the return series on the factors, one least squares solve for
+        # every column at once: centering both sides takes the intercept out
         # ----Input-----
-        # returns: return series, the return's date should match factor's date
-        #          eg. the first return and the first row factors are in the same date
+        # returns: return series, or a matrix with one return series per column, the return's date should match
+        #          factor's date eg. the first return and the first row factors are in the same date
         # ----output----
-        # regression coefficient
-        reg = LinearRegression().fit(self.factorMatrix, returns)
-        self.betaMatrix = reg.coef_.T
-        return reg.coef_.T
+        # regression coefficient, one row per factor (and one column per return series)
+        factors = self.factorMatrix - self.factorMatrix.mean(axis=0)
+        returns = returns - returns.mean(axis=0)
+        coef, _, _, _ = np.linalg.lstsq(factors, returns, rcond=None)
+        return coef
 
-    def var(self, marketValue=0, window=252, approximation=False):
+    def var(self, marketValue=0, window=252, approximation=False, es=False):
         # Return value at risk for portfolio
         # ----Input-----
         # marketValue: the market value of portfolio, if the value is less or equal zero, function will return percentage result
         # approximation:  If true, using portfolio return to run beta regression. If false, using each stock series to run beta regression
         # window: scale time period, default value is 252 which returns annualized VaR
+        # es: also return the expected shortfall, normal closed form from the same factor variance
         # ----output----
-        # Value at Risk in dollar or percentage if input market value is zero
+        # Value at Risk in dollar or percentage if input market value is zero, an array with one VaR per confidence
+        # level if ci is a list (the betas are regressed once for every level), (VaR, ES) if es is true
 
         if (approximation):
-            input = np.dot(self.input, self.weights).reshape((-1, 1))
+            returns = np.nan_to_num(np.diff(np.log(np.dot(self.input, self.weights)), axis=0)).reshape((-1, 1))
         else:
-            input = self.input
-
-        colNum = input.shape[1]
-        betas = []
-        for i in range(colNum):
-            singlePrice = input[:, i]
-            singleReturn = np.nan_to_num(np.diff(np.log(singlePrice), axis=0))
-            betas.append(list(self.betaRegression(singleReturn)))
-        self.betaMatrix = np.array(betas).T
+            returns = self.returnMatrix
+
+        self.betaMatrix = self.betaRegression(returns)
         self.CovVarMat = np.dot(np.dot(self.betaMatrix.T, self.factorCovVarMat), self.betaMatrix)
 
         if (approximation):
@@ -86,10 +106,33 @@ class PCAVaR(ValueAtRisk):
         else:
             self.variance = np.dot(np.dot(self.weights, self.CovVarMat), self.weights.T)
 
-        if (marketValue <= 0):
-            return abs(norm.ppf(self.ci) * np.sqrt(self.variance)) * math.sqrt(window)
-        else:
-            return marketValue * abs(norm.ppf(self.ci) * np.sqrt(self.variance)) * math.sqrt(window)
+        scale = math.sqrt(window) * (marketValue if marketValue > 0 else 1)
+        return ValueAtRisk.scaleRisk(normal_tail_risk(np.sqrt(self.variance), 1 - np.asarray(self.ci), es), scale)
+
+    def riskCovariance(self):
+        # Factor implied covariance of the assets, B' Cov(F) B with the loadings regressed on every asset's returns
+        self.betaMatrix = self.betaRegression(self.returnMatrix)
+        self.CovVarMat = np.dot(np.dot(self.betaMatrix.T, self.factorCovVarMat), self.betaMatrix)
+        return self.CovVarMat
+
+    def factorDecomposition(self, marketValue=0, window=252):
+        # Euler allocation of the PCA VaR over the factors, through the portfolio's factor exposures B w
+        # ----Input-----
+        # marketValue: the market value of portfolio, if the value is less or equal zero, function will return percentage
+        # window: scale time period, default value is 252 which returns annualized VaR
+        # ----output----
+        # DataFrame with one row per factor: exposure, marginal VaR, component VaR (they sum to the VaR) and its share
+        if np.ndim(self.ci) != 0:
+            raise Exception("Decomposition needs a single confidence interval", self.ci)
+        self.betaMatrix = self.betaRegression(self.returnMatrix)
+        exposure = np.dot(self.betaMatrix, self.weights)
+        covExposure = np.dot(self.factorCovVarMat, exposure)
+        sigma = np.sqrt(np.dot(exposure, covExposure))
+        scale = normal_tail_risk(1.0, 1 - self.ci) * math.sqrt(window) * (marketValue if marketValue > 0 else 1)
+        marginal = scale * covExposure / sigma
+        component = exposure * marginal
+        return pd.DataFrame({'Exposure': exposure, 'Marginal VaR': marginal, 'Component VaR': component,
+                             'Component %': component / (scale * sigma)})
 
 if __name__ == '__main__':
     df = pd.read_csv('/fermi_backend/models/VaR/Data/portfolio.csv')
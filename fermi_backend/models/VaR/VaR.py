@@ -4,9 +4,9 @@ Created on Wed Jul 25 20:24:32 2018
 
 @author: William Huang
 """
+from ..utils import normal_tail_risk
 import pandas as pd
 import numpy as np
-from scipy.stats import norm
 import math
 
 
@@ -14,14 +14,11 @@ class ValueAtRisk:
 	def __init__(self, interval, matrix, weights):
 		# Initialize the basic parameters
 		# ----Input-----
-		# interval: significant interval in statistic, range from 0 to 1
+		# interval: significant interval in statistic, range from 0 to 1, or a list of them to get every VaR at once
 		# matrix: stock price matrix, each row represents one day price for different tickers, two dimentions ndarray
 		# weight: the weight for portfolio, one dimension array
 		# ----output----
-		if 0 < interval < 1:
-			self.ci = interval
-		else:
-			raise Exception("Invalid confidence interval", interval)
+		self.setCI(interval)
 
 		if isinstance(matrix, pd.DataFrame):
 			matrix = matrix.values
@@ -65,7 +62,7 @@ class ValueAtRisk:
 			self.variance = np.dot(np.dot(self.weights, np.cov(self.returnMatrix.T)), self.weights.T)
 		return self.variance
 
-	def var(self, marketValue=0, Approximation=False, window=252):
+	def var(self, marketValue=0, Approximation=False, window=252, es=False):
 		# return parametric value at risk, the variance can be calculated by either cov matrix way or approximate way,
 		# scale the one day VaR according to user specified time period
 		# ----Input-----
@@ -74,24 +71,61 @@ class ValueAtRisk:
 		# approximation:  If true, using portfolio return to calculate variance.
 		# If false, using cov-var matrix to calculate
 		# window: scale time period, default value is 252 which returns annualized VaR
+		# es: also return the expected shortfall, normal closed form from the same variance
 		# ----output----
 		# Value at Risk in dollar
-		# or percentage if input market value is zero
+		# or percentage if input market value is zero, an array with one VaR per confidence level if ci is a list
+		# (VaR, ES) if es is true
 		if self.returnMatrix.shape[1] != len(self.weights):
 			raise Exception("The weights and portfolio doesn't match")
 		self.calculateVariance(Approximation)
-		if marketValue <= 0:
-			return abs(norm.ppf(self.ci) * np.sqrt(self.variance)) * math.sqrt(window)
-		else:
-			return abs(norm.ppf(self.ci) * np.sqrt(self.variance)) * marketValue * math.sqrt(window)
+		scale = math.sqrt(window) * (marketValue if marketValue > 0 else 1)
+		return ValueAtRisk.scaleRisk(normal_tail_risk(np.sqrt(self.variance), 1 - np.asarray(self.ci), es), scale)
+
+	def riskCovariance(self):
+		# covariance matrix the VaR decomposition is taken on, the sample covariance of the returns
+		return np.cov(self.returnMatrix.T)
+
+	def decomposition(self, marketValue=0, window=252):
+		# Euler allocation of the parametric VaR over the assets, every column from one covariance product Cov w
+		# ----Input-----
+		# marketValue: the market value of portfolio, if the value is less or equal zero, function will return percentage
+		# window: scale time period, default value is 252 which returns annualized VaR
+		# ----output----
+		# DataFrame with one row per asset: weight, marginal VaR (dVaR/dw), component VaR (w * marginal, they sum to
+		# the VaR), its share of the VaR, and incremental VaR (VaR lost by dropping the asset, from the closed form
+		# leave-one-out variance w'Cov w - 2 w_i (Cov w)_i + w_i^2 Cov_ii rather than n re-runs)
+		if np.ndim(self.ci) != 0:
+			raise Exception("Decomposition needs a single confidence interval", self.ci)
+		cov = self.riskCovariance()
+		covWeights = np.dot(cov, self.weights)
+		self.variance = np.dot(self.weights, covWeights)
+		sigma = np.sqrt(self.variance)
+		scale = normal_tail_risk(1.0, 1 - self.ci) * math.sqrt(window) * (marketValue if marketValue > 0 else 1)
+		marginal = scale * covWeights / sigma
+		component = self.weights * marginal
+		leaveOneOut = self.variance - 2 * self.weights * covWeights + self.weights * self.weights * np.diag(cov)
+		incremental = scale * (sigma - np.sqrt(np.maximum(leaveOneOut, 0)))
+		return pd.DataFrame({'Weight': self.weights, 'Marginal VaR': marginal, 'Component VaR': component,
+							 'Component %': component / (scale * sigma), 'Incremental VaR': incremental})
+
+	@staticmethod
+	def scaleRisk(risk, scale):
+		# scale a VaR, or a (VaR, ES) pair, to the market value and time period
+		if isinstance(risk, tuple):
+			return tuple(value * scale for value in risk)
+		return risk * scale
 
 	def setCI(self, interval):
 		# set the confidence interval for value at risk
 		# ----Input-----
-		# interval: significant interval in statistic, range from 0 to 1
+		# interval: significant interval in statistic, range from 0 to 1, or a list of them
 		# ----output----
-		if 0 < interval < 1:
-			self.ci = interval
+		if np.ndim(interval) > 1 or np.size(interval) == 0:
+			raise Exception("Invalid confidence interval", interval)
+		ci = np.asarray(interval, dtype=np.float64)
+		if np.all((0 < ci) & (ci < 1)):
+			self.ci = interval if ci.ndim == 0 else ci
 		else:
 			raise Exception("Invalid confidence interval", interval)
 
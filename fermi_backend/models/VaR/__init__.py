@@ -1,7 +1,7 @@
 __author__ = "Kaihua(William) Huang (khuang41@fordham.edu)"
 __version__ = "1.0.0"
-__all__ = ['VaR','HistoricalVaR','PCAVaR']
+__all__ = ['VaR','HistoricalVaR','PCAVaR','Backtest']
 from .VaR import ValueAtRisk
 from .HistoricalVaR import HistoricalVaR
 from .PCAVaR import PCAVaR
-
+from .Backtest import VaRBacktest
@@ -0,0 +1,13 @@
+"""
+Performance benchmarks for fermi_backend.models, built on pytest-benchmark.
+
+Every benchmark runs on seeded synthetic data (or the bundled VaR/Data csv files) and needs no network.
+Install the test dependencies with `pip install -r requirements-dev.txt`, then run from the repository root and keep
+the JSON to compare commits:
+
+    pytest fermi_backend/models/benchmarks --benchmark-json=benchmarks.json
+    pytest fermi_backend/models/benchmarks --benchmark-autosave
+    pytest fermi_backend/models/benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+
+Each result records the problem size in extra_info, so runs at different sizes stay distinguishable in the JSON.
+"""
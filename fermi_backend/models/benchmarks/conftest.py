@@ -0,0 +1,31 @@
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+from .data import load_csv
+
+# The older models import each other as `models.<package>`, so the fermi_backend directory has to be importable
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[2]))
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture(scope='session')
+def portfolio_csv():
+    return load_csv('portfolio')
+
+
+@pytest.fixture(scope='session')
+def single_stock_csv():
+    return load_csv('singleStock')
+
+
+@pytest.fixture(scope='session')
+def universe_csv():
+    # Align on dates with the portfolio file and drop tickers with gaps, as PCAVaR needs matching rows
+    return load_csv('universe').reindex(load_csv('portfolio').index).dropna(axis=1)
@@ -0,0 +1,39 @@
+"""
+Seeded synthetic inputs and the bundled csv fixtures for the benchmarks
+"""
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+DATA_PATH = pathlib.Path(__file__).resolve().parent.parent / 'VaR' / 'Data'
+# (days, assets) of the synthetic price panels
+PANEL_SIZES = [(252, 4), (1260, 50), (2520, 200)]
+
+
+def synthetic_prices(days, assets, seed=0, factors=3):
+    """
+    Price panel of correlated GBM paths driven by a few common factors, so PCA and covariance based models see
+    realistic structure
+
+    :param days: number of rows (trading days)
+    :param assets: number of columns (tickers)
+    :param seed: seed for reproducibility
+    :param factors: number of common factors
+    :return: DataFrame indexed by business day, one column per ticker
+    """
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0, 0.008, (factors, assets))
+    returns = rng.normal(0, 0.01, (days - 1, factors)) @ loadings + rng.normal(0.0003, 0.01, (days - 1, assets))
+    start = rng.uniform(20, 500, assets)
+    prices = start * np.exp(np.vstack([np.zeros(assets), np.cumsum(returns, axis=0)]))
+    index = pd.bdate_range('2015-01-02', periods=days, name='date')
+    return pd.DataFrame(prices, index=index, columns=[f'T{i:03d}' for i in range(assets)])
+
+
+def load_csv(name):
+    """
+    :param name: 'portfolio', 'singleStock' or 'universe'
+    :return: bundled price table indexed by date
+    """
+    return pd.read_csv(DATA_PATH / f'{name}.csv', index_col='date', parse_dates=True).astype(float)
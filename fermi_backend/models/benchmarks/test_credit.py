@@ -0,0 +1,67 @@
+import pytest
+
+from models.Geske.Geske import Geske
+from models.Liquidity.Liquidity import Liquidity
+
+STEPS = [50, 200, 1000]
+
+
+def geske_model(steps, s0=100, ttm=(1, 2), debt=(60, 40)):
+    return Geske(s0, list(ttm), list(debt), steps=steps)
+
+
+@pytest.mark.parametrize('steps', STEPS)
+def test_geske(benchmark, steps):
+    model = geske_model(steps)
+    benchmark.extra_info['size'] = steps
+    benchmark(model.geske, 'lattice')
+
+
+def test_geske_closed_form(benchmark):
+    benchmark(geske_model(50).geske, 'closed')
+
+
+@pytest.mark.parametrize('steps', STEPS)
+def test_geske_asset_price(benchmark, steps):
+    model = geske_model(steps)
+    benchmark.extra_info['size'] = steps
+    benchmark(model.getAssetPrice, 45, method='lattice')
+
+
+@pytest.mark.parametrize('steps', STEPS)
+def test_geske_default_probability(benchmark, steps):
+    model = geske_model(steps)
+    benchmark.extra_info['size'] = steps
+    benchmark(model.calculateProb, 'lattice')
+
+
+@pytest.mark.parametrize('steps', STEPS)
+def test_liquid_price(benchmark, steps):
+    model = Liquidity(k=1, rf=0.05, steps=steps, vol=0.2, ttm=1)
+    benchmark.extra_info['size'] = steps
+    benchmark(model.liquidPrice, 1000, 900, 1100, 1, 2, 0)
+
+
+@pytest.mark.parametrize('steps', STEPS)
+def test_get_liquid_price(benchmark, steps):
+    model = Liquidity(k=1, rf=0.05, steps=steps, vol=0.3, ttm=1)
+    benchmark.extra_info['size'] = steps
+    benchmark(model.getLiquidPrice, 900, 1100, 1, 2, 0, 300)
+
+
+def test_calibrate_wealth(benchmark):
+    model = Liquidity()
+    benchmark(model.calibrateWealth, 0.8, 0.05, 0, 0.3, 1, 1, 1000)
+
+
+@pytest.mark.parametrize('firms', [100, 10000])
+def test_calibrate_cross_section(benchmark, rng, firms):
+    adjustment = rng.uniform(0.5, 1.2, firms)
+    equity = rng.uniform(1, 1000, firms)
+    benchmark.extra_info['size'] = firms
+
+    def calibrate():
+        wealth = Liquidity.calibrateWealth(adjustment, 0, 0, 0.3, 1, 1, equity)
+        return Liquidity.illquidPrice(wealth, wealth * adjustment, 1, 0.05, 1.6, 0.3)
+
+    benchmark(calibrate)
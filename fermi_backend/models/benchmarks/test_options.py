@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from fermi_backend.models.Options.options import Options
+
+STEPS = [100, 1000, 10000]
+CHAIN_SIZES = [10, 1000, 100000]
+PATHS = [10000, 100000]
+
+
+def option_chain(size, seed=0):
+    rng = np.random.default_rng(seed)
+    return Options.batch(100, rng.uniform(50, 150, size), 0.03, 0.01, rng.uniform(0.1, 0.6, size),
+                         rng.uniform(0.05, 2, size), rng.choice([1, -1], size))
+
+
+@pytest.mark.parametrize('size', CHAIN_SIZES)
+def test_bs_chain(benchmark, size):
+    options = option_chain(size)
+    benchmark.extra_info['size'] = size
+    benchmark(options.bs)
+
+
+@pytest.mark.parametrize('american', [False, True])
+@pytest.mark.parametrize('N', STEPS)
+def test_binomial_tree(benchmark, N, american):
+    options = Options(100, 105, 0.03, 0.01, 0.25, 1, -1)
+    benchmark.extra_info['size'] = N
+    benchmark(options.binomial_tree, N, american)
+
+
+@pytest.mark.parametrize('N', [100, 1000])
+def test_binomial_tree_chain(benchmark, N):
+    options = option_chain(100)
+    benchmark.extra_info['size'] = N
+    benchmark(options.binomial_tree, N, True)
+
+
+@pytest.mark.parametrize('size', [100, 10000])
+def test_implied_vol_chain(benchmark, size):
+    options = option_chain(size)
+    prices = options.bs()
+    benchmark.extra_info['size'] = size
+    benchmark(options.implied_vol, prices)
+
+
+@pytest.mark.parametrize('n_paths', PATHS)
+@pytest.mark.parametrize('payoff', ['european', 'asian'])
+def test_monte_carlo(benchmark, payoff, n_paths):
+    options = Options(100, 105, 0.03, 0.01, 0.25, 1, 1)
+    benchmark.extra_info['size'] = n_paths
+    benchmark(options.monte_carlo, payoff, n_paths, 52, seed=0)
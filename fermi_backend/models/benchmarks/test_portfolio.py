@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from fermi_backend.models.Portfolio.portfolio import Portfolio
+from fermi_backend.models.Portfolio.monte_carlo import monte_carlo_var
+from .data import PANEL_SIZES, synthetic_prices
+
+SAMPLES = [10000, 1000000]
+
+
+@pytest.mark.parametrize('days,assets', PANEL_SIZES[:2])
+def test_optimization(benchmark, days, assets):
+    portfolio = Portfolio(synthetic_prices(days, assets))
+    benchmark.extra_info['size'] = [days, assets]
+    benchmark(portfolio.optimization)
+
+
+def test_optimization_csv(benchmark, portfolio_csv):
+    portfolio = Portfolio(portfolio_csv.copy())
+    benchmark(portfolio.optimization)
+
+
+@pytest.mark.parametrize('n', SAMPLES)
+def test_monte_carlo_var(benchmark, n, portfolio_csv):
+    portfolio = Portfolio(portfolio_csv.copy())
+    benchmark.extra_info['size'] = n
+    benchmark(portfolio.monte_carlo_var, 5, n, seed=0)
+
+
+@pytest.mark.parametrize('innovations', ['normal', 't', 'bootstrap'])
+@pytest.mark.parametrize('n', SAMPLES)
+def test_multivariate_monte_carlo_var(benchmark, n, innovations):
+    prices = synthetic_prices(1260, 50)
+    returns = np.diff(np.log(prices.values), axis=0)
+    benchmark.extra_info['size'] = [n, 50]
+    benchmark(monte_carlo_var, returns, np.full(50, 1 / 50), [1, 5], n, horizon=10, innovations=innovations, es=True,
+              seed=0)
+
+
+@pytest.mark.parametrize('dimension,particles', [(4, 100), (20, 1000)])
+def test_pso(benchmark, dimension, particles):
+    torch = pytest.importorskip('torch')
+    from fermi_backend.models.PSO.PSO import pso
+
+    def sphere(x):
+        return float((x * x).sum())
+
+    torch.manual_seed(0)
+    benchmark.extra_info['size'] = [dimension, particles]
+    benchmark(pso, sphere, dimension, bounds=(-1.0, 1.0), particle_num=particles, maxit=20)
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from models.VaR.VaR import ValueAtRisk
+from models.VaR.HistoricalVaR import HistoricalVaR
+from models.VaR.Backtest import VaRBacktest
+from .data import PANEL_SIZES, synthetic_prices
+
+
+INTERVALS = [0.995, 0.99, 0.98, 0.975, 0.95]
+
+
+def equal_weights(n):
+    return np.full(n, 1 / n)
+
+
+@pytest.mark.parametrize('days,assets', PANEL_SIZES)
+def test_parametric_var(benchmark, days, assets):
+    prices = synthetic_prices(days, assets)
+    benchmark.extra_info['size'] = [days, assets]
+    benchmark(lambda: ValueAtRisk(0.95, prices, equal_weights(assets)).var(marketValue=1000000))
+
+
+@pytest.mark.parametrize('days,assets', PANEL_SIZES)
+def test_historical_var(benchmark, days, assets):
+    prices = synthetic_prices(days, assets)
+    benchmark.extra_info['size'] = [days, assets]
+    benchmark(lambda: HistoricalVaR(0.95, prices, equal_weights(assets)).var(marketValue=1000000, window=100))
+
+
+@pytest.mark.parametrize('days,assets', PANEL_SIZES)
+def test_var_all_intervals(benchmark, days, assets):
+    # The Homework1 report: parametric and historical VaR at every confidence level in one pass each
+    prices = synthetic_prices(days, assets)
+    benchmark.extra_info['size'] = [days, assets]
+
+    def report():
+        parametric = ValueAtRisk(INTERVALS, prices, equal_weights(assets))
+        historical = HistoricalVaR(INTERVALS, prices, equal_weights(assets))
+        return parametric.var(marketValue=1000000, window=1), historical.var(marketValue=1000000, window=100)
+
+    benchmark(report)
+
+
+@pytest.mark.parametrize('days,assets', PANEL_SIZES)
+def test_var_decomposition(benchmark, days, assets):
+    prices = synthetic_prices(days, assets)
+    benchmark.extra_info['size'] = [days, assets]
+    benchmark(lambda: ValueAtRisk(0.99, prices, equal_weights(assets)).decomposition(marketValue=1000000, window=1))
+
+
+@pytest.mark.parametrize('method', ['historical', 'parametric'])
+@pytest.mark.parametrize('days,assets', [(2520, 100), (5040, 100)])
+def test_var_backtest(benchmark, days, assets, method):
+    prices = synthetic_prices(days, assets)
+    benchmark.extra_info['size'] = [days, assets]
+    benchmark(lambda: VaRBacktest(INTERVALS, prices, equal_weights(assets), window=252).backtest(method))
+
+
+@pytest.mark.parametrize('days,assets', PANEL_SIZES)
+def test_pca_var(benchmark, days, assets):
+    pytest.importorskip('sklearn')
+    from models.VaR.PCAVaR import PCAVaR
+
+    prices = synthetic_prices(days, assets, seed=1)
+    universe = synthetic_prices(days, max(assets, 20), seed=2)
+
+    def run():
+        model = PCAVaR(0.95, prices, universe, equal_weights(assets))
+        model.getComponents(3)
+        return model.var(marketValue=1000000)
+
+    benchmark.extra_info['size'] = [days, assets]
+    benchmark(run)
+
+
+def test_var_csv(benchmark, portfolio_csv):
+    benchmark(lambda: ValueAtRisk(0.95, portfolio_csv, equal_weights(portfolio_csv.shape[1])).var())
+
+
+def test_historical_var_csv(benchmark, portfolio_csv):
+    benchmark(lambda: HistoricalVaR(0.95, portfolio_csv, equal_weights(portfolio_csv.shape[1])).var(window=100))
+
+
+def test_pca_var_csv(benchmark, portfolio_csv, universe_csv):
+    pytest.importorskip('sklearn')
+    from models.VaR.PCAVaR import PCAVaR
+
+    def run():
+        model = PCAVaR(0.95, portfolio_csv, universe_csv, equal_weights(portfolio_csv.shape[1]))
+        model.getComponents(5)
+        return model.var()
+
+    benchmark(run)
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from scipy.stats import norm
 
 
 def calc_returns(df, method=None):
@@ -25,3 +26,37 @@ def covariance_matrix(df: pd.DataFrame, method=None, **kwargs) -> pd.DataFrame:
         return cov
 
 
+def tail_risk(returns, tail, es=False):
+    """
+    Historical VaR and expected shortfall from one sort of the returns
+
+    :param returns: one dimension array of returns
+    :param tail: tail probability (e.g. 0.05) or an array of them
+    :param es: also return the expected shortfall, the average return at or below the VaR quantile
+    :return: VaR (the nearest rank quantile, as np.percentile(method='nearest')), or (VaR, ES), as positive losses
+    """
+    ordered = np.sort(np.asarray(returns, dtype=np.float64))
+    ranks = np.percentile(np.arange(len(ordered)), 100 * np.asarray(tail), method='nearest').astype(int)
+    var = np.abs(ordered[ranks])
+    if not es:
+        return var if var.ndim else float(var)
+    shortfall = np.abs(np.cumsum(ordered)[ranks] / (ranks + 1))
+    return (var, shortfall) if var.ndim else (float(var), float(shortfall))
+
+
+def normal_tail_risk(sigma, tail, es=False):
+    """
+    Zero mean normal VaR and expected shortfall in closed form
+
+    :param sigma: standard deviation of the returns
+    :param tail: tail probability (e.g. 0.05) or an array of them
+    :param es: also return the expected shortfall, sigma * pdf(z) / tail
+    :return: VaR, or (VaR, ES), as positive losses
+    """
+    tail = np.asarray(tail, dtype=np.float64)
+    z = norm.ppf(tail)
+    var = np.abs(z * sigma)
+    if not es:
+        return var if np.ndim(var) else float(var)
+    shortfall = sigma * norm.pdf(z) / tail
+    return (var, shortfall) if np.ndim(var) else (float(var), float(shortfall))
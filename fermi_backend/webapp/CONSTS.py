@@ -9,6 +9,11 @@ ROOT_PATH = pathlib.Path.home()
 
 REPORT_FREQ_USER_ACTIVITY = 3600 * 4
 DB_UPLOAD_MAX_ROW_NUM = 2048
+IV_SURFACE_CACHE_SIZE = 64
+IV_SURFACE_CACHE_TTL = 3600 * 24
+OPTIONS_PRICING_CACHE_SIZE = 4096
+OPTIONS_PRICING_CACHE_TTL = 3600
+CREDIT_RISK_PROCESSES = 4
 
 GAME_RM_NOTIONAL = 100000
 ANALYTICS_DECIMALS = 4
@@ -1,8 +1,11 @@
+import hashlib
+
 import pandas as pd
 import numpy as np
-from yahoo_fin import options
+from yahoo_fin import options, stock_info
 from typing import List, Optional, Union
-from datetime import datetime
+from datetime import datetime, date
+from fermi_backend.models.Options.options import Options
 
 
 def get_options_expiration_date(ticker: str) -> List:
@@ -17,3 +20,53 @@ def get_options_data(ticker: str, date: Union[str, datetime] = None, call: bool
     return df.to_json(orient='records')
 
 
+def get_options_chains(ticker: str, call: bool = True) -> pd.DataFrame:
+    """
+    Every expiration's calls (or puts) stacked into one frame, with the expiration date in an 'Expiration' column
+    """
+    frames = []
+    for expiration in get_options_expiration_date(ticker):
+        df = options.get_calls(ticker=ticker, date=expiration) if call else options.get_puts(ticker=ticker, date=expiration)
+        df['Expiration'] = expiration
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_spot_price(ticker: str) -> float:
+    return float(stock_info.get_live_price(ticker))
+
+
+def chain_snapshot_key(chain: pd.DataFrame, s: float, rf: float, div: float, call: bool = True) -> str:
+    """
+    Digest of the quotes and pricing inputs a surface is built from. Two requests share a surface only if they saw
+    the same chain on the same day
+    """
+    digest = hashlib.sha1(pd.util.hash_pandas_object(chain, index=False).values.tobytes())
+    digest.update(repr((s, rf, div, call, date.today().isoformat())).encode())
+    return digest.hexdigest()
+
+
+def build_iv_surface(chain: pd.DataFrame, s: float, rf: float = 0.0, div: float = 0.0, call: bool = True,
+                     today: Optional[date] = None) -> dict:
+    """
+    Strike x expiration implied volatility grid from a stacked chain (see get_options_chains). Quotes use the bid/ask
+    mid when both sides are posted and the last price otherwise; every contract is solved in one vectorized call
+    """
+    today = pd.Timestamp(today or date.today())
+    expiration = pd.to_datetime(chain['Expiration'], format='%B %d, %Y')
+    T = ((expiration - today).dt.days / 365).values
+    strike = pd.to_numeric(chain['Strike'], errors='coerce').values
+    bid = pd.to_numeric(chain['Bid'], errors='coerce').values
+    ask = pd.to_numeric(chain['Ask'], errors='coerce').values
+    last = pd.to_numeric(chain['Last Price'], errors='coerce').values
+    price = np.where((bid > 0) & (ask > 0), (bid + ask) / 2, last)
+
+    iv = Options.batch(s, strike, rf, div, np.nan, T, 1 if call else -1).implied_vol(price)
+    grid = pd.DataFrame({'Strike': strike, 'Expiration': expiration, 'iv': iv}) \
+        .pivot_table(index='Strike', columns='Expiration', values='iv', aggfunc='mean') \
+        .sort_index(axis=0).sort_index(axis=1)
+    return {'s': s,
+            'strikes': grid.index.tolist(),
+            'expirations': [x.strftime('%Y-%m-%d') for x in grid.columns],
+            'T': [(x - today).days / 365 for x in grid.columns],
+            'iv': grid.astype(object).where(grid.notna(), None).values.tolist()}
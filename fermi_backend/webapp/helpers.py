@@ -1,5 +1,10 @@
 import functools
+import json
+import pickle
+import threading
+import time
 import traceback
+from collections import OrderedDict
 from datetime import datetime
 from decimal import Decimal
 from typing import List, Optional, Union
@@ -172,6 +177,104 @@ def checkMarketTime(now=None):
     return True
 
 
+# ---------------------- Result cache ----------------------
+
+def canonical_key(values) -> str:
+    """
+    Stable cache key for request inputs: numbers are normalised to floats printed at 12 significant digits, so
+    100, 100.0 and 100.0000000000001 map to the same key, and dict keys are sorted
+    """
+
+    def canonical(x):
+        if isinstance(x, (bool, str)) or x is None:
+            return x
+        if isinstance(x, (int, float, Decimal, np.number)):
+            return format(float(x), '.12g')
+        if isinstance(x, dict):
+            return {str(k): canonical(v) for k, v in x.items()}
+        if isinstance(x, (list, tuple, np.ndarray)):
+            return [canonical(v) for v in x]
+        return str(x)
+
+    return json.dumps(canonical(values), sort_keys=True, separators=(',', ':'))
+
+
+class ResultCache:
+    """
+    In-process LRU cache with a TTL, optionally backed by a shared redis tier (e.g. redis_cache) so results are
+    reused across workers. Redis errors are treated as misses, the in-process tier keeps working without redis
+    """
+
+    def __init__(self, maxsize: int, ttl: int, redis=None, prefix: str = ''):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis = redis
+        self.prefix = prefix
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        :return: (found, value)
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, item[1]
+            if item is not None:
+                del self._data[key]
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(self.prefix + key)
+                # Entries carry their wall-clock expiry, so the in-process copy expires with the redis one
+                expires, value = pickle.loads(raw) if raw is not None else (None, None)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Redis cache lookup failed: {e}")
+                raw = None
+            remaining = expires - time.time() if raw is not None else 0
+            if remaining > 0:
+                self._put(key, value, now + min(remaining, self.ttl))
+                with self._lock:
+                    self.redis_hits += 1
+                return True, value
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def set(self, key: str, value):
+        self._put(key, value, time.monotonic() + self.ttl)
+        if self.redis is not None:
+            try:
+                self.redis.set(self.prefix + key, pickle.dumps((time.time() + self.ttl, value)), ex=self.ttl)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Redis cache write failed: {e}")
+
+    def _put(self, key, value, expires):
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.redis_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'ttl': self.ttl, 'hits': self.hits,
+                    'redis_hits': self.redis_hits, 'misses': self.misses,
+                    'hit_rate': (self.hits + self.redis_hits) / lookups if lookups else None}
+
+
 # ---------------------- SQL Related... ----------------------
 
 def parse_sql_results(result_proxy, orient="records"):
@@ -20,8 +20,8 @@ from starlette.middleware.sessions import SessionMiddleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
 from starlette.middleware.trustedhost import TrustedHostMiddleware
 from starlette.responses import JSONResponse
-from fermi_backend.webapp.routers import auth, data, game, options, portfolio, stock, sentiment, users, worker, \
-    tests
+from fermi_backend.webapp.routers import auth, credit, data, game, options, portfolio, stock, sentiment, users, \
+    worker, tests
 from fermi_backend.webapp.config import ENV
 
 
@@ -77,6 +77,7 @@ logging.root.handlers = [
 logger = logging.getLogger(__name__)
 
 app.include_router(auth.router)
+app.include_router(credit.router)
 # app.include_router(aws.router)
 app.include_router(data.router)
 app.include_router(game.router)
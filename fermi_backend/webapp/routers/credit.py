@@ -0,0 +1,65 @@
+import traceback
+
+import numpy as np
+import pandas as pd
+from fastapi import APIRouter
+
+from fermi_backend.models.Data.Data import FinanceData
+from fermi_backend.models.Geske.Geske import creditRiskTable
+from fermi_backend.models.Liquidity.Liquidity import Liquidity
+from .. import CONSTS
+from ..webapp_models.generic_models import ResultResponse
+
+router = APIRouter(
+    prefix="/credit",
+    tags=["credit"]
+)
+
+
+@router.post("/geske_batch")
+def geske_batch_api(request_body: dict):
+    """
+    Geske asset values and default probabilities for a list of firms, e.g.:
+    {"firms": [{"ticker": "AMZN", "ttm": [1, 2], "debt": [60, 40]}, ...], "rf": 0.05, "steps": 200, "method": "auto"}
+    Debt is in billions, like Homework2. Vols and market caps are fetched concurrently and the firms are solved over
+    a pool of CONSTS.CREDIT_RISK_PROCESSES worker processes; firms that fail keep a row with an 'Error' message
+    """
+    try:
+        firms = request_body['firms']
+        rf, steps = request_body.get('rf', 0.05), request_body.get('steps', 200)
+        method = request_body.get('method', 'auto')
+        tickers = [firm['ticker'] for firm in firms]
+        market_data = FinanceData().getVolsAndMarketCaps(tickers)
+        table = creditRiskTable(
+            [(firm['ticker'], firm['ttm'], firm['debt'], vol, None if market_cap is None else market_cap / 1e9)
+             for firm, vol, market_cap in zip(firms, market_data['Vol'], market_data['MarketCap'])],
+            rf, steps, method, CONSTS.CREDIT_RISK_PROCESSES)
+        result = table.replace({np.nan: None}).to_dict(orient='records')
+    except Exception as e:
+        return ResultResponse(status_code=CONSTS.HTTP_500_INTERNAL_SERVER_ERROR, message=f"An exception occurred {str(e)}:\n{traceback.format_exc()}", )
+    return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)
+
+
+@router.post("/liquidity_batch")
+def liquidity_batch_api(request_body: dict):
+    """
+    Calibrated wealth and illiquid asset value for a cross-section of firms, the Homework3 calibration in one call:
+    {"firms": [{"ticker": "AMZN", "equity": 1500, "adjustment_factor": 0.8, "vol": 0.3}, ...],
+     "rf": 0.05, "T": 1, "ttm": 1, "sharpe_ratio": 1.6}
+    The wealth is calibrated at zero rate and dividend, like Homework3, with 'vol' defaulting to 0.3 per firm. Firms whose wealth can't match the equity come back with a null 'Wealth'
+    """
+    try:
+        firms = pd.DataFrame(request_body['firms'])
+        rf = request_body.get('rf', 0.05)
+        T, ttm = request_body.get('T', 1), request_body.get('ttm', 1)
+        sharpe_ratio = request_body.get('sharpe_ratio', 1.6)
+        adjustment = firms['adjustment_factor'].to_numpy(dtype=np.float64)
+        firms['vol'] = firms['vol'].fillna(0.3) if 'vol' in firms else 0.3
+        vol = firms['vol'].to_numpy(dtype=np.float64)
+        wealth = Liquidity.calibrateWealth(adjustment, 0, 0, vol, T, 1, firms['equity'].to_numpy(dtype=np.float64))
+        firms['Wealth'] = wealth
+        firms['Illiquid Asset'] = Liquidity.illquidPrice(wealth, wealth * adjustment, ttm, rf, sharpe_ratio, vol)
+        result = firms.replace({np.nan: None}).to_dict(orient='records')
+    except Exception as e:
+        return ResultResponse(status_code=CONSTS.HTTP_500_INTERNAL_SERVER_ERROR, message=f"An exception occurred {str(e)}:\n{traceback.format_exc()}", )
+    return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)
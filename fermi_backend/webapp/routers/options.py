@@ -1,10 +1,14 @@
 import traceback
 
+import numpy as np
 from fastapi import APIRouter
 from datetime import datetime
-from fermi_backend.webapp.data.get_options import get_options_expiration_date, get_options_data
+from fermi_backend.webapp.data.get_options import get_options_expiration_date, get_options_data, \
+    get_options_chains, get_spot_price, chain_snapshot_key, build_iv_surface
 from fermi_backend.models.Options.options import Options
+from fermi_backend.webapp import redis_cache
 from .. import CONSTS
+from ..helpers import ResultCache, canonical_key
 from ..webapp_models.generic_models import ResultResponse
 
 router = APIRouter(
@@ -32,21 +36,153 @@ def get_options_data_api(requestBody: dict):
     return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)
 
 
+# Lattice schemes selectable through the 'method' field
+LATTICE_METHODS = {'Binomial Tree': 'crr', 'Leisen-Reimer': 'lr', 'Trinomial Tree': 'trinomial'}
+# Request fields that determine an /options_pricing result, with their defaults
+PRICING_DEFAULTS = {'s': None, 'k': None, 'rf': None, 'div': None, 'vol': None, 'T': None, 'options_type': None,
+                    'N': None, 'method': None, 'american': False, 'dividends': None, 'richardson': False,
+                    'payoff': 'european', 'n_paths': 100000, 'barrier': None, 'barrier_type': 'down-and-out',
+                    'sobol': False, 'seed': None}
+pricing_cache = ResultCache(CONSTS.OPTIONS_PRICING_CACHE_SIZE, CONSTS.OPTIONS_PRICING_CACHE_TTL, redis_cache,
+                            prefix='OPTIONS_PRICING:')
+iv_surface_cache = ResultCache(CONSTS.IV_SURFACE_CACHE_SIZE, CONSTS.IV_SURFACE_CACHE_TTL, redis_cache,
+                               prefix='IV_SURFACE:')
+
+
 @router.post("/options_pricing")
 def options_pricing_api(request_body: dict):
+    """
+    'method' is 'BS', 'Binomial Tree', 'Leisen-Reimer', 'Trinomial Tree' or 'Monte Carlo'. Optional 'american',
+    'dividends' ([[payment time in years, cash amount], ...]) and 'richardson' (extrapolate N and 2N steps) apply to
+    the lattices. 'Monte Carlo' takes 'payoff' ('european', 'asian', 'barrier', 'lookback'), 'n_paths', 'barrier',
+    'barrier_type', 'sobol' and 'seed', with N monitoring dates per path.
+    'BS' and a plain 'Binomial Tree' return the price; the other requests return
+    {"price": ..., "error": ...} with the discretisation error estimate (Leisen-Reimer only, null for the oscillating
+    Binomial and Trinomial trees) or the Monte Carlo standard error.
+    Results are cached on the canonicalised inputs (except unseeded Monte Carlo), see /pricing_cache_stats
+    """
     try:
+        # Key on the inputs with defaults filled in, so an omitted field and its default share an entry
+        params = {name: request_body.get(name, default) for name, default in PRICING_DEFAULTS.items()}
+        key = canonical_key(params)
+        cacheable = params['method'] != 'Monte Carlo' or params['seed'] is not None
+        found, result = pricing_cache.get(key) if cacheable else (False, None)
+        if found:
+            return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)
         s, k, rf, div, vol, T, options_type, N, method = request_body['s'], request_body['k'], request_body['rf'], \
                                                          request_body['div'], request_body['vol'], request_body['T'], \
                                                          request_body['options_type'], request_body['N'], request_body[
                                                              'method']
+        american, dividends, richardson = params['american'], params['dividends'], params['richardson']
         pc_flag = 1 if options_type == 'call' else -1
         options = Options(s, k, rf, div, vol, T, pc_flag)
         if method == 'BS':
             result = options.bs()
-        elif method == 'Binomial Tree':
-            result = options.binomial_tree(N)
+        elif method == 'Binomial Tree' and not richardson:
+            result = options.binomial_tree(N, american, dividends)
+        elif method in LATTICE_METHODS:
+            price, error = options.tree_estimate(N, american, dividends, LATTICE_METHODS[method], richardson)
+            result = {'price': price, 'error': error}
+        elif method == 'Monte Carlo':
+            price, error = options.monte_carlo(params['payoff'], params['n_paths'], N, params['barrier'],
+                                               params['barrier_type'], sobol=params['sobol'], seed=params['seed'])
+            result = {'price': price, 'error': error}
         else:
             result = 0
+        if cacheable:
+            pricing_cache.set(key, result)
+    except Exception as e:
+        return ResultResponse(status_code=CONSTS.HTTP_500_INTERNAL_SERVER_ERROR, message=f"An exception occurred {str(e)}:\n{traceback.format_exc()}", )
+    return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)
+
+
+@router.get("/pricing_cache_stats")
+def pricing_cache_stats_api():
+    return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=pricing_cache.stats())
+
+
+def parse_option_chain(request_body: dict) -> Options:
+    """
+    Build a batched Options from a chain request. 'k', 'vol', 'T' and 'options_type' may each be a list
+    (one entry per contract) or a scalar shared by every contract
+    """
+    s, k, rf, div, vol, T, options_type = request_body['s'], request_body['k'], request_body['rf'], \
+                                          request_body['div'], request_body['vol'], request_body['T'], \
+                                          request_body['options_type']
+    pc_flag = np.where(np.asarray(options_type) == 'call', 1, -1)
+    return Options.batch(s, k, rf, div, vol, T, pc_flag)
+
+
+@router.post("/options_pricing_batch")
+def options_pricing_batch_api(request_body: dict):
+    """
+    Price a whole option chain in one call, e.g.:
+    {"s": 100, "k": [90, 100, 110], "rf": 0.05, "div": 0, "vol": 0.2, "T": [0.5, 0.5, 1],
+     "options_type": ["call", "put", "call"], "N": 500, "method": ["BS", "Binomial Tree"],
+     "american": true, "dividends": [[0.25, 1.1], [0.75, 1.1]]}
+    'american' and 'dividends' (payment time in years, cash amount) only apply to the binomial tree
+    """
+    try:
+        options = parse_option_chain(request_body)
+        N = request_body.get('N', 100)
+        methods = request_body.get('method', ['BS', 'Binomial Tree'])
+        american, dividends = request_body.get('american', False), request_body.get('dividends')
+        if isinstance(methods, str):
+            methods = [methods]
+        result = {}
+        for method in methods:
+            if method == 'BS':
+                result[method] = options.bs().tolist()
+            elif method in LATTICE_METHODS:
+                result[method] = options.binomial_tree(N, american, dividends, LATTICE_METHODS[method]).tolist()
+            else:
+                raise Exception("Invalid method", method)
     except Exception as e:
         return ResultResponse(status_code=CONSTS.HTTP_500_INTERNAL_SERVER_ERROR, message=f"An exception occurred {str(e)}:\n{traceback.format_exc()}", )
-    return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)
\ No newline at end of file
+    return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)
+
+
+@router.post("/greeks")
+def greeks_api(request_body: dict):
+    """
+    Greeks for a whole option chain, same body as /options_pricing_batch. 'method' is 'BS' (closed form: delta, gamma,
+    vega, theta, rho), 'Binomial Tree' or 'Leisen-Reimer' (delta, gamma, theta read off the first levels of an N-step
+    tree)
+    """
+    try:
+        options = parse_option_chain(request_body)
+        method = request_body.get('method', 'BS')
+        if method == 'BS':
+            greeks = options.greeks()
+        elif method in ('Binomial Tree', 'Leisen-Reimer'):
+            greeks = options.binomial_greeks(request_body.get('N', 100), request_body.get('american', False),
+                                             request_body.get('dividends'), LATTICE_METHODS[method])
+        else:
+            raise Exception("Invalid method", method)
+        result = {name: np.asarray(value).tolist() for name, value in greeks.items()}
+    except Exception as e:
+        return ResultResponse(status_code=CONSTS.HTTP_500_INTERNAL_SERVER_ERROR, message=f"An exception occurred {str(e)}:\n{traceback.format_exc()}", )
+    return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)
+
+
+@router.post("/iv_surface")
+def iv_surface_api(request_body: dict):
+    """
+    Strike x expiration implied volatility surface over every listed expiration of a ticker, e.g.:
+    {"ticker": "SPY", "rf": 0.05, "div": 0.015, "options_type": "call"}
+    Surfaces are cached per ticker and chain snapshot, so reloading an unchanged chain skips the solve
+    """
+    try:
+        ticker = request_body['ticker']
+        rf, div = request_body.get('rf', 0.0), request_body.get('div', 0.0)
+        call = request_body.get('options_type', 'call') == 'call'
+        chain = get_options_chains(ticker, call)
+        s = request_body.get('s') or get_spot_price(ticker)
+        key = f"{ticker}:{chain_snapshot_key(chain, s, rf, div, call)}"
+        found, result = iv_surface_cache.get(key)
+        if not found:
+            result = build_iv_surface(chain, s, rf, div, call)
+            iv_surface_cache.set(key, result)
+    except Exception as e:
+        return ResultResponse(status_code=CONSTS.HTTP_500_INTERNAL_SERVER_ERROR, message=f"An exception occurred {str(e)}:\n{traceback.format_exc()}", )
+    return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)
@@ -5,8 +5,11 @@ from fastapi import APIRouter
 from .. import CONSTS
 from ..helpers import round_result
 from fermi_backend.models.Portfolio import Portfolio
+from fermi_backend.models.VaR.VaR import ValueAtRisk
+from fermi_backend.models.VaR.PCAVaR import PCAVaR
 from ..webapp_models.generic_models import ResultResponse, Data, CDSData
 from ..CONSTS import ANALYTICS_DECIMALS
+import numpy as np
 import pandas as pd
 
 router = APIRouter(
@@ -31,11 +34,18 @@ def get_basic_info(data: Data) -> ResultResponse:
 
 
 @round_result(ANALYTICS_DECIMALS)
-def get_all_var(data, weights, level, decay, n):
+def get_all_var(data, weights, level, decay, n, es=False):
+    # level may be a list of tail percentages, every method then returns one value per level from a single pass
     p = Portfolio(data, weights)
-    result = {'Historical VaR': p.hvar(level),
-              'Parametric VaR': p.pvar(level / 100, alpha=decay),
-              'Monte Carlo VaR': p.monte_carlo_var(level, n)}
+    results = {'Historical': p.hvar(level, es=es),
+               'Parametric': p.pvar(np.asarray(level) / 100, alpha=decay, es=es),
+               'Monte Carlo': p.monte_carlo_var(level, n, es=es)}
+    result = {}
+    for method, risk in results.items():
+        var, shortfall = risk if es else (risk, None)
+        result[f'{method} VaR'] = np.asarray(var).tolist()
+        if es:
+            result[f'{method} ES'] = np.asarray(shortfall).tolist()
     return result
 
 
@@ -44,7 +54,47 @@ def valueatrisk(requestbody: dict) -> ResultResponse:
     try:
         data, weights, level, decay, n = pd.DataFrame(requestbody['data']), requestbody['weights'], requestbody[
             'level'], requestbody['alpha'], requestbody['n']
-        result = get_all_var(data, weights, level, decay, n)
+        result = get_all_var(data, weights, level, decay, n, requestbody.get('es', False))
+    except Exception as e:
+        return ResultResponse(status_code=CONSTS.HTTP_500_INTERNAL_SERVER_ERROR, message=f"An exception occurred {str(e)}:\n{traceback.format_exc()}", )
+    return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)
+
+
+@round_result(ANALYTICS_DECIMALS)
+def get_var_decomposition(data, weights, level, market_value, window, universe=None, n_components=5):
+    # Parametric VaR split over the holdings, or PCA factor VaR (over the holdings and the factors) given a universe
+    p = Portfolio(data, weights=weights)
+    ci, weights = 1 - level / 100, np.asarray(p.weights)
+    if universe is None:
+        model = ValueAtRisk(ci, p.df.values, weights)
+    else:
+        universe = universe.drop(columns=[col for col in universe.columns if 'date' in col.lower()])
+        model = PCAVaR(ci, p.df.values, universe, weights)
+        model.getComponents(n_components)
+    assets = model.decomposition(market_value, window)
+    assets.insert(0, 'Ticker', list(p.df.columns))
+    result = {'VaR': float(assets['Component VaR'].sum()), 'Assets': assets.to_dict(orient='records')}
+    if universe is not None:
+        factors = model.factorDecomposition(market_value, window)
+        factors.insert(0, 'Factor', [f'PC{i + 1}' for i in range(len(factors))])
+        result['Factors'] = factors.to_dict(orient='records')
+    return result
+
+
+@router.post("/var_decomposition")
+def var_decomposition_api(requestbody: dict) -> ResultResponse:
+    """
+    Marginal, component and incremental VaR of every holding, e.g.:
+    {"data": {...price table...}, "weights": [...], "level": 5, "market_value": 1000000, "window": 1}
+    Adding a "universe" price table over the same dates (and optionally "n_components") decomposes the PCA factor
+    VaR instead, and also splits it over the factors
+    """
+    try:
+        data = pd.DataFrame(requestbody['data'])
+        universe = pd.DataFrame(requestbody['universe']) if requestbody.get('universe') else None
+        result = get_var_decomposition(data, requestbody.get('weights'), requestbody.get('level', 5),
+                                       requestbody.get('market_value', 0), requestbody.get('window', 1), universe,
+                                       requestbody.get('n_components', 5))
     except Exception as e:
         return ResultResponse(status_code=CONSTS.HTTP_500_INTERNAL_SERVER_ERROR, message=f"An exception occurred {str(e)}:\n{traceback.format_exc()}", )
     return ResultResponse(status_code=CONSTS.HTTP_200_OK, content=result)